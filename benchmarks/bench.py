@@ -0,0 +1,284 @@
+"""Benchmark harness for the parse, resolve and render stages.
+
+Usage::
+
+    python -m benchmarks.bench                       # all fixtures but "huge"
+    python -m benchmarks.bench -f small -f main -r 5
+    python -m benchmarks.bench --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench --baseline benchmarks/baseline.json --fail-on-regression
+
+Each stage is timed separately, ``--repeat`` times, on fixtures from
+:mod:`benchmarks.fixtures`.  Results are printed as a table and, with
+``--output``, written as JSON; with ``--baseline`` every stage is compared
+against a stored run.
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from depviz import apkindex
+from depviz.ascii_tree import write_tree
+from depviz.graph import Resolver
+from depviz.provides import ProvidesIndex, index_parallel, index_text
+from depviz.render import PackedGraph
+from depviz.svg import write_svg
+from depviz.testrepo import TestRepository, load_test_repository
+
+from . import fixtures
+
+DEFAULT_THRESHOLD = 0.10
+# Pool sizes for the chunked text-to-index stages; the single-process
+# "index_text" stage is their reference.
+PARALLEL_WORKERS = (4, 8)
+
+
+def _timed(func, repeat):
+    """Run *func* *repeat* times; return (timings, last result)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return timings, result
+
+
+def _stats(timings, **counters):
+    return {
+        "best": min(timings),
+        "mean": statistics.fmean(timings),
+        "runs": len(timings),
+        **counters,
+    }
+
+
+def _decompress(path):
+    with open(path, "rb") as f:
+        return b"".join(apkindex.iter_index_chunks(f))
+
+
+def _parse(data):
+    chunks = (data[i:i + apkindex.CHUNK_SIZE] for i in range(0, len(data), apkindex.CHUNK_SIZE))
+    return [apkindex.parse_stanza(raw) for raw in apkindex.iter_stanzas(chunks)]
+
+
+def _parse_mapped(path):
+    with open(path, "rb") as f:
+        return list(apkindex.iter_packages(f))
+
+
+def _index_text(data):
+    """Uncompressed APKINDEX text to an index in this process."""
+    spans = apkindex.iter_mapped_spans(data)
+    return ProvidesIndex(apkindex.parse_stanza(data, start, end) for start, end in spans)
+
+
+def _merge(chunks):
+    index = ProvidesIndex()
+    for chunk in chunks:
+        index.merge(chunk)
+    return index
+
+
+def _load_lines(path):
+    """Reference loader iterating the text file line by line, for comparison
+    with the memory-mapped :func:`~depviz.testrepo.load_test_repository`."""
+    repo = TestRepository()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                name, _, deps = line.partition(":")
+                repo.add(name.strip(), deps.split())
+    return repo
+
+
+def _updated(packages, every=300):
+    """Return *packages* with the ``V:`` and ``C:`` of every *every*-th record bumped."""
+    updated = []
+    for i, pkg in enumerate(packages):
+        if i % every == 0:
+            pkg = apkindex.Package(pkg.name, pkg.version + "_p1", pkg.depends, pkg.provides,
+                                   f"{pkg.checksum}+")
+        updated.append(pkg)
+    return updated
+
+
+def _refresh(packages, updated, root, repeat):
+    """Time diff, apply and invalidation of *updated* against a warm index."""
+    timings = []
+    for _ in range(repeat):
+        index = ProvidesIndex(packages)
+        resolver = Resolver(index)
+        resolver.closure(root)
+        gc.collect()
+        started = time.perf_counter()
+        changes = index.apply(index.diff(updated))
+        changes.dropped = resolver.invalidate(changes.affected)
+        timings.append(time.perf_counter() - started)
+    return timings, changes
+
+
+def _render_ascii(graph):
+    out = io.StringIO()
+    write_tree(graph.edges, graph.root, out)
+    return out.tell()
+
+
+def _render_svg(graph):
+    out = io.StringIO()
+    write_svg(PackedGraph.pack(graph), out)
+    return out.tell()
+
+
+def bench_apkindex(name, repeat):
+    path = fixtures.fixture_path(name)
+    root = fixtures.apkindex_root(fixtures.FIXTURES[name][1])
+    stages = {}
+
+    timings, data = _timed(lambda: _decompress(path), repeat)
+    stages["decompress"] = _stats(timings, bytes=len(data))
+    timings, packages = _timed(lambda: _parse(data), repeat)
+    stages["parse"] = _stats(timings, stanzas=len(packages))
+    plain = fixtures.plain_index_path(name)
+    timings, mapped = _timed(lambda: _parse_mapped(plain), repeat)
+    stages["parse_mapped"] = _stats(timings, stanzas=len(mapped))
+    del mapped
+    with open(plain, "rb") as f:
+        text = f.read()
+    timings, _ = _timed(lambda: _index_text(text), repeat)
+    stages["index_text"] = _stats(timings)
+    for workers in PARALLEL_WORKERS:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Start the workers before timing; a CLI run pays this once.
+            list(pool.map(abs, range(workers)))
+            timings, _ = _timed(lambda: _merge(index_parallel(text, pool, workers)), repeat)
+        stages[f"index_text_{workers}"] = _stats(timings, workers=workers)
+    # The part of the parallel stages that stays in the parent process.
+    chunks = [index_text(text[start:end])
+              for start, end in apkindex.split_stanzas(text, PARALLEL_WORKERS[-1])]
+    timings, _ = _timed(lambda: _merge(chunks), repeat)
+    stages["merge"] = _stats(timings, chunks=len(chunks))
+    del text, chunks
+    timings, index = _timed(lambda: ProvidesIndex(packages), repeat)
+    stages["index"] = _stats(timings, packages=len(index))
+    updated = _updated(packages)
+    timings, changes = _refresh(packages, updated, root, repeat)
+    stages["refresh"] = _stats(timings, changed=len(changes.changed),
+                               affected=len(changes.affected))
+    timings, _ = _timed(lambda: ProvidesIndex(updated), repeat)
+    stages["rebuild"] = _stats(timings)
+    timings, graph = _timed(lambda: Resolver(index).closure(root), repeat)
+    stages["resolve"] = _stats(timings, nodes=graph.node_count, edges=graph.edge_count)
+    timings, size = _timed(lambda: _render_ascii(graph), repeat)
+    stages["render_ascii"] = _stats(timings, chars=size)
+    timings, size = _timed(lambda: _render_svg(graph), repeat)
+    stages["render_image"] = _stats(timings, chars=size)
+    return stages
+
+
+def bench_testrepo(name, repeat):
+    path = fixtures.fixture_path(name)
+    stages = {}
+
+    timings, repo = _timed(lambda: load_test_repository(path), repeat)
+    stages["load"] = _stats(timings, packages=len(repo), edges=repo.edge_count)
+    timings, _ = _timed(lambda: _load_lines(path), repeat)
+    stages["load_lines"] = _stats(timings)
+    timings, graph = _timed(lambda: Resolver(repo).closure("P0"), repeat)
+    stages["resolve"] = _stats(timings, nodes=graph.node_count, edges=graph.edge_count)
+    timings, size = _timed(lambda: _render_ascii(graph), repeat)
+    stages["render_ascii"] = _stats(timings, chars=size)
+    return stages
+
+
+BENCHES = {"apkindex": bench_apkindex, "testrepo": bench_testrepo}
+
+
+def run(names, repeat):
+    results = {}
+    for name in names:
+        kind, _ = fixtures.FIXTURES[name]
+        print(f"running {name} ...", file=sys.stderr)
+        results[name] = BENCHES[kind](name, repeat)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Return rows ``(fixture, stage, base, now, ratio, regressed)``."""
+    rows = []
+    for name, stages in current["results"].items():
+        for stage, stats in stages.items():
+            base = baseline.get("results", {}).get(name, {}).get(stage)
+            if base is None:
+                continue
+            ratio = stats["best"] / base["best"] if base["best"] else float("inf")
+            rows.append((name, stage, base["best"], stats["best"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def print_table(report, rows=None, file=sys.stdout):
+    print(f"{'fixture':<10} {'stage':<14} {'best ms':>10} {'mean ms':>10}", file=file)
+    for name, stages in report["results"].items():
+        for stage, stats in stages.items():
+            print(f"{name:<10} {stage:<14} {stats['best'] * 1000:>10.2f} "
+                  f"{stats['mean'] * 1000:>10.2f}", file=file)
+    if rows:
+        print(file=file)
+        print(f"{'fixture':<10} {'stage':<14} {'base ms':>10} {'now ms':>10} {'ratio':>7}",
+              file=file)
+        for name, stage, base, now, ratio, regressed in rows:
+            mark = "  REGRESSION" if regressed else ""
+            print(f"{name:<10} {stage:<14} {base * 1000:>10.2f} {now * 1000:>10.2f} "
+                  f"{ratio:>7.2f}{mark}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench",
+                                     description="Time depviz stages on fixture indexes.")
+    parser.add_argument("-f", "--fixture", action="append", choices=sorted(fixtures.FIXTURES),
+                        help="fixture to run (repeatable; default: all but 'huge')")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results stored in this file")
+    parser.add_argument("--save-baseline", metavar="FILE", help="store results as a new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown ratio above 1 counted as a regression (default: 0.10)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="exit with status 1 if any stage regressed")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    report = run(args.fixture or list(fixtures.DEFAULT_FIXTURES), args.repeat)
+    rows = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            rows = compare(report, json.load(f), args.threshold)
+    print_table(report, rows)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+    if args.fail_on_regression and rows and any(row[-1] for row in rows):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
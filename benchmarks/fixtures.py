@@ -0,0 +1,122 @@
+"""Deterministic benchmark fixtures.
+
+Fixtures are synthesized from a fixed seed instead of being checked in, and
+written once to ``benchmarks/.fixtures``.  APKINDEX fixtures mimic the real
+archive layout (a gzip'ed signature tar segment followed by a gzip'ed tar
+with ``DESCRIPTION`` and ``APKINDEX``) and realistic stanza contents.
+"""
+
+import gzip
+import os
+import random
+import tarfile
+
+from depviz import apkindex, gen_testrepo
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fixtures")
+
+# name -> (kind, package count)
+FIXTURES = {
+    "small": ("apkindex", 300),
+    "main": ("apkindex", 6000),
+    "large": ("apkindex", 60_000),
+    "synthetic": ("testrepo", 500_000),
+    "huge": ("testrepo", 6_000_000),
+}
+# Run when no fixture is named; "large" is the size of main and community
+# merged, "huge" a ~250 MB file for I/O benchmarks.
+DEFAULT_FIXTURES = ("small", "main", "synthetic")
+
+SONAME = "so:libc.musl-x86_64.so.1"
+
+
+def _tar(members, terminate):
+    """Return a ustar stream; without *terminate* the end-of-archive blocks
+    are left out, so two gzip members concatenate into one tar stream."""
+    out = bytearray()
+    for name, data in members:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        out += info.tobuf(tarfile.USTAR_FORMAT)
+        out += data + b"\0" * (-len(data) % tarfile.BLOCKSIZE)
+    if terminate:
+        out += b"\0" * (2 * tarfile.BLOCKSIZE)
+    return bytes(out)
+
+
+def _stanzas(count, rng):
+    names = ["musl", "busybox"] + [f"lib{i}" if i % 3 else f"tool{i}" for i in range(2, count)]
+    for i, name in enumerate(names):
+        lines = [
+            f"C:Q1{rng.getrandbits(160):040x}=",
+            f"P:{name}",
+            f"V:{rng.randint(0, 9)}.{rng.randint(0, 40)}.{rng.randint(0, 9)}-r{rng.randint(0, 5)}",
+            "A:x86_64",
+            f"S:{rng.randint(1000, 900000)}",
+            f"I:{rng.randint(4000, 4000000)}",
+            f"T:Synthetic package {name} used for benchmarks",
+            f"U:https://example.org/{name}",
+            "L:MIT",
+            f"o:{name}",
+            f"m:Maintainer {i % 50} <m{i % 50}@example.org>",
+            f"t:{1700000000 + i}",
+            f"c:{rng.getrandbits(160):040x}",
+        ]
+        deps = set()
+        if i:
+            deps.add(SONAME)
+        if i > 2:
+            for _ in range(rng.randint(0, 4)):
+                j = rng.randrange(2, i)
+                deps.add(f"so:lib{j}.so.1" if j % 3 else f"cmd:tool{j}")
+        if deps:
+            lines.append("D:" + " ".join(sorted(deps)))
+        provides = [f"so:{name}.so.1=1" if i % 3 else f"cmd:{name}=1"]
+        if name == "musl":
+            provides = [f"{SONAME}=1"]
+        lines.append("p:" + " ".join(provides))
+        yield "\n".join(lines) + "\n"
+
+
+def apkindex_root(count):
+    """Name of the last, most dependency-heavy package of an APKINDEX fixture."""
+    i = count - 1
+    return f"lib{i}" if i % 3 else f"tool{i}"
+
+
+def build_apkindex(path, count, seed=0):
+    rng = random.Random(seed)
+    index = "\n".join(_stanzas(count, rng)).encode("utf-8")
+    signature = gzip.compress(_tar([(".SIGN.RSA.bench.rsa.pub", b"\0" * 256)], False))
+    body = gzip.compress(_tar([("DESCRIPTION", b"bench"), ("APKINDEX", index)], True))
+    with open(path, "wb") as f:
+        f.write(signature + body)
+
+
+def fixture_path(name):
+    """Return the path of fixture *name*, building it on first use."""
+    kind, count = FIXTURES[name]
+    suffix = ".tar.gz" if kind == "apkindex" else ".txt"
+    path = os.path.join(FIXTURE_DIR, f"{name}-{count}{suffix}")
+    if not os.path.exists(path):
+        os.makedirs(FIXTURE_DIR, exist_ok=True)
+        tmp = path + ".part"
+        if kind == "apkindex":
+            build_apkindex(tmp, count)
+        else:
+            with open(tmp, "w", encoding="utf-8") as f:
+                gen_testrepo.generate(f, count, degree=4, shape="layered")
+        os.replace(tmp, path)
+    return path
+
+
+def plain_index_path(name):
+    """Return the extracted, uncompressed APKINDEX of fixture *name*."""
+    archive = fixture_path(name)
+    path = archive[:-len(".tar.gz")] + ".APKINDEX"
+    if not os.path.exists(path):
+        with open(archive, "rb") as src, open(path + ".part", "wb") as dst:
+            for chunk in apkindex.iter_index_chunks(src):
+                dst.write(chunk)
+        os.replace(path + ".part", path)
+    return path
@@ -0,0 +1,3 @@
+"""Dependency graph visualizer for Alpine Linux packages."""
+
+__version__ = "0.1.0"
@@ -0,0 +1,220 @@
+"""asyncio alternative to :mod:`depviz.repository`.
+
+A small HTTP/1.1 client on top of :func:`asyncio.open_connection` that
+keeps connections alive between requests to the same host, so fetching the
+indexes of several repositories (or architectures) of one mirror costs a
+single TCP/TLS handshake.  Selected with the ``async_fetch`` config key.
+
+Unlike the urllib path, this client does not overlap download and
+parsing: a body is received in full before the archive is handed on, so
+the pooled connection is free for the next request.  Bodies are spooled
+to a temporary file (or the cache) as they arrive, never held in memory.
+"""
+
+import asyncio
+import http.client
+import ssl
+import tempfile
+from urllib.parse import urljoin, urlsplit
+
+from . import profiling
+from .errors import RepositoryError
+from .repository import TIMEOUT, USER_AGENT, index_url, is_remote
+
+MAX_REDIRECTS = 5
+BODY_CHUNK = 256 * 1024
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class _Response:
+    """Status and headers of an answer; ``body`` is a rewound file for a 200, else ``None``."""
+
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+
+async def _copy(reader, sink, size):
+    """Move *size* bytes (all until EOF for ``None``) from *reader* to file *sink*.
+
+    With a ``None`` *sink* the bytes are read and dropped.
+    """
+    while size is None or size > 0:
+        data = await reader.read(BODY_CHUNK if size is None else min(size, BODY_CHUNK))
+        if not data:
+            if size is None:
+                return
+            raise asyncio.IncompleteReadError(b"", size)
+        if sink is not None:
+            sink.write(data)
+        if size is not None:
+            size -= len(data)
+
+
+class AsyncRepositoryClient:
+    """Fetches index archives with bounded concurrency and connection reuse."""
+
+    def __init__(self, cache=None, concurrency=4):
+        self.cache = cache
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._idle = {}
+        self._ssl = None
+
+    async def close(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _connect(self, key):
+        scheme, host, port = key
+        context = None
+        if scheme == "https":
+            if self._ssl is None:
+                self._ssl = ssl.create_default_context()
+            context = self._ssl
+        return await asyncio.open_connection(host, port, ssl=context)
+
+    async def _exchange(self, reader, writer, target, host, headers):
+        lines = [f"GET {target} HTTP/1.1", f"Host: {host}", f"User-Agent: {USER_AGENT}",
+                 "Connection: keep-alive", "Accept-Encoding: identity"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by peer")
+        version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+                                   + [""])[:3]
+        message = http.client.HTTPMessage()
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            message[name.strip()] = value.strip()
+
+        status = int(status)
+        keep_alive = (version == "HTTP/1.1"
+                      and message.get("Connection", "").lower() != "close")
+        # Only an archive is kept; redirect and error bodies are drained
+        # so the connection can be reused.
+        body = tempfile.TemporaryFile() if status == 200 else None
+        try:
+            if status == 304 or 100 <= status < 200:
+                pass
+            elif message.get("Transfer-Encoding", "").lower() == "chunked":
+                while True:
+                    size = int((await reader.readline()).split(b";")[0], 16)
+                    if size == 0:
+                        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                            pass
+                        break
+                    await _copy(reader, body, size)
+                    await reader.readexactly(2)
+            elif message.get("Content-Length") is not None:
+                await _copy(reader, body, int(message["Content-Length"]))
+            else:
+                await _copy(reader, body, None)
+                keep_alive = False
+        except BaseException:
+            if body is not None:
+                body.close()
+            raise
+        if body is not None:
+            body.seek(0)
+        return _Response(status, reason, message, body), keep_alive
+
+    async def _request(self, url, headers):
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key = (parts.scheme, parts.hostname, port)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        idle = self._idle.setdefault(key, [])
+        # A pooled connection may have been closed by the server meanwhile;
+        # such a failure is retried once on a fresh connection.
+        for attempt in range(2):
+            reused = bool(idle)
+            reader, writer = idle.pop() if reused else await self._connect(key)
+            try:
+                response, keep_alive = await asyncio.wait_for(
+                    self._exchange(reader, writer, target, parts.netloc, headers), TIMEOUT)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if reused and attempt == 0:
+                    continue
+                raise OSError(f"connection failed: {e}") from None
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive:
+                idle.append((reader, writer))
+            else:
+                writer.close()
+            return response
+
+    async def fetch(self, repository):
+        """Return a binary file object with the index archive of *repository*."""
+        location = index_url(repository)
+        if not is_remote(location):
+            try:
+                return open(location, "rb")
+            except OSError as e:
+                raise RepositoryError(f"cannot open {location}: {e.strerror}") from None
+        headers = self.cache.validators(location) if self.cache is not None else {}
+        url = location
+        async with self._semaphore:
+            try:
+                for _ in range(MAX_REDIRECTS + 1):
+                    response = await self._request(url, headers)
+                    if response.status not in REDIRECT_CODES:
+                        break
+                    url = urljoin(url, response.headers.get("Location", ""))
+            except (OSError, ValueError, asyncio.TimeoutError) as e:
+                raise RepositoryError(f"cannot fetch {location}: {e or 'timed out'}") from None
+        if response.status == 304 and self.cache is not None:
+            profiling.get().count("fetch", "cache_hits")
+            return self.cache.open(location)
+        if response.status != 200:
+            raise RepositoryError(f"{location}: HTTP {response.status} {response.reason}")
+        if self.cache is None:
+            return response.body
+        try:
+            with response.body:
+                self.cache.store(location, response.body, response.headers)
+        except OSError as e:
+            raise RepositoryError(f"cannot store {location} in cache: {e}") from None
+        return self.cache.open(location)
+
+    async def fetch_all(self, repositories):
+        """Fetch every repository concurrently; results keep the input order."""
+        results = await asyncio.gather(*(self.fetch(r) for r in repositories),
+                                       return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            for r in results:
+                if not isinstance(r, BaseException):
+                    r.close()
+            raise errors[0]
+        return results
+
+
+def open_indexes(repositories, cache=None, concurrency=4):
+    """Synchronous wrapper: fetch all *repositories* over one event loop."""
+
+    async def main():
+        async with AsyncRepositoryClient(cache, concurrency) as client:
+            return await client.fetch_all(repositories)
+
+    return asyncio.run(main())
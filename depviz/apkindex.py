@@ -0,0 +1,413 @@
+"""Streaming parser for Alpine ``APKINDEX.tar.gz`` archives.
+
+The archive is a concatenation of gzip members (signature, then the index
+proper) which together form one tar stream.  Nothing here ever holds more
+than one read chunk plus one partial stanza in memory: the archive is
+inflated chunk by chunk, the ``APKINDEX`` member is split on blank lines and
+each stanza is parsed and yielded on demand.
+
+An already extracted, uncompressed ``APKINDEX`` on the local disk is
+memory-mapped instead: stanza boundaries are found by searching the map
+and records decode their fields straight out of it.
+"""
+
+import mmap
+import zlib
+
+from . import profiling
+from .errors import IndexFormatError
+
+CHUNK_SIZE = 64 * 1024
+INDEX_MEMBER = "APKINDEX"
+STANZA_SEPARATOR = b"\n\n"
+GZIP_MAGIC = b"\x1f\x8b"
+GZIP_WBITS = zlib.MAX_WBITS | 16
+TAR_BLOCK = 512
+NUL_BLOCK = bytes(TAR_BLOCK)
+REGULAR_TYPES = (b"0", b"\0", b"7")
+LONG_NAME_TYPES = (b"L", b"x")
+
+
+_UNDECODED = object()
+
+
+def _field(raw, key, start, end):
+    """Return the value of the ``key:`` line of ``raw[start:end]``, or ``None``.
+
+    *raw* is ``bytes`` or an ``mmap``; both search in place, so only the
+    value itself is ever copied out.
+    """
+    if raw[start:start + len(key)] == key:
+        pos = start + len(key)
+    else:
+        pos = raw.find(b"\n" + key, start, end)
+        if pos < 0:
+            return None
+        pos += len(key) + 1
+    eol = raw.find(b"\n", pos, end)
+    return raw[pos:eol if eol >= 0 else end].decode("utf-8", "replace")
+
+
+class Package:
+    """One index record.
+
+    Records built by :meth:`from_stanza` keep the raw stanza bytes (or the
+    span of a memory-mapped index) and decode each of ``P:``, ``V:``,
+    ``D:``, ``p:`` and ``C:`` on first access only; descriptions, licenses
+    and URLs are never decoded at all.
+    """
+
+    __slots__ = ("_raw", "_start", "_end", "_name", "_version", "_depends", "_provides",
+                 "_checksum")
+
+    def __init__(self, name, version="", depends=None, provides=None, checksum=None):
+        self._raw = None
+        self._name = name
+        self._version = version
+        self._depends = [] if depends is None else depends
+        self._provides = [] if provides is None else provides
+        self._checksum = checksum
+
+    @classmethod
+    def from_stanza(cls, raw, start=0, end=None):
+        pkg = cls.__new__(cls)
+        pkg._raw = raw
+        pkg._start = start
+        pkg._end = len(raw) if end is None else end
+        pkg._name = pkg._version = pkg._depends = pkg._provides = pkg._checksum = _UNDECODED
+        return pkg
+
+    @property
+    def name(self):
+        if self._name is _UNDECODED:
+            self._name = _field(self._raw, b"P:", self._start, self._end)
+        return self._name
+
+    @property
+    def version(self):
+        if self._version is _UNDECODED:
+            self._version = _field(self._raw, b"V:", self._start, self._end) or ""
+        return self._version
+
+    @property
+    def depends(self):
+        if self._depends is _UNDECODED:
+            self._depends = (_field(self._raw, b"D:", self._start, self._end) or "").split()
+        return self._depends
+
+    @property
+    def provides(self):
+        if self._provides is _UNDECODED:
+            self._provides = (_field(self._raw, b"p:", self._start, self._end) or "").split()
+        return self._provides
+
+    @property
+    def checksum(self):
+        """The ``C:`` package checksum, or ``None`` if the record has none."""
+        if self._checksum is _UNDECODED:
+            self._checksum = _field(self._raw, b"C:", self._start, self._end)
+        return self._checksum
+
+    def __eq__(self, other):
+        if not isinstance(other, Package):
+            return NotImplemented
+        return (self.name, self.version, self.depends, self.provides) == \
+            (other.name, other.version, other.depends, other.provides)
+
+    def __repr__(self):
+        return (f"Package(name={self.name!r}, version={self.version!r}, "
+                f"depends={self.depends!r}, provides={self.provides!r})")
+
+
+class _TarStream:
+    """Minimal forward-only tar reader over a stream of byte pieces.
+
+    Only what is needed to find one member is implemented: ustar and GNU
+    headers, GNU long names and pax ``path`` records.  Member data is
+    handed out piece by piece as it arrives, or skipped, never collected.
+    """
+
+    def __init__(self, pieces):
+        self._pieces = pieces
+        self._piece = b""
+        self._pos = 0
+
+    def _next_piece(self):
+        for piece in self._pieces:
+            if piece:
+                self._piece = piece
+                self._pos = 0
+                return True
+        return False
+
+    def _iter_data(self, size):
+        """Yield the next *size* bytes of the stream in pieces."""
+        while size:
+            if self._pos == len(self._piece) and not self._next_piece():
+                raise IndexFormatError("truncated APKINDEX archive")
+            end = min(self._pos + size, len(self._piece))
+            yield self._piece[self._pos:end]
+            size -= end - self._pos
+            self._pos = end
+
+    def _read(self, size):
+        return b"".join(self._iter_data(size))
+
+    def _skip(self, size):
+        for _ in self._iter_data(size):
+            pass
+
+    def _header(self):
+        """Return ``(name, type, size)`` of the next member, or ``None`` at the end."""
+        if self._pos == len(self._piece) and not self._next_piece():
+            return None
+        header = self._read(TAR_BLOCK)
+        if header == NUL_BLOCK:
+            return None
+        try:
+            checksum = _tar_number(header[148:156])
+            size = _tar_number(header[124:136])
+        except ValueError:
+            raise IndexFormatError("invalid tar header in APKINDEX archive") from None
+        if checksum != sum(header[:148]) + 8 * 0x20 + sum(header[156:]):
+            raise IndexFormatError("invalid tar header in APKINDEX archive")
+        name = header[:100].split(b"\0", 1)[0]
+        if header[257:262] == b"ustar" and header[345] != 0:
+            name = header[345:500].split(b"\0", 1)[0] + b"/" + name
+        return name, header[156:157], size
+
+    def find(self, member):
+        """Yield the data of the first member called *member* (bytes) in pieces."""
+        long_name = None
+        while True:
+            header = self._header()
+            if header is None:
+                return False
+            name, kind, size = header
+            padding = -size % TAR_BLOCK
+            if kind in LONG_NAME_TYPES:
+                data = self._read(size)
+                self._skip(padding)
+                long_name = _long_name(kind, data) or long_name
+                continue
+            if long_name is not None:
+                name, long_name = long_name, None
+            if kind in REGULAR_TYPES and name == member:
+                yield from self._iter_data(size)
+                return True
+            self._skip(size + padding)
+
+
+def _tar_number(field):
+    if field[0] & 0x80:
+        # GNU base-256 encoding for values that do not fit in octal.
+        return int.from_bytes(field[1:], "big")
+    return int(field.strip(b" \0") or b"0", 8)
+
+
+def _long_name(kind, data):
+    if kind == b"L":
+        return data.split(b"\0", 1)[0]
+    if kind == b"x":
+        # pax records: "<length> <key>=<value>\n"
+        for record in data.split(b"\n"):
+            key, _, value = record.partition(b" ")[2].partition(b"=")
+            if key == b"path":
+                return value
+    return None
+
+
+def _inflate(fileobj, chunk_size):
+    """Yield the decompressed bytes of a multi-member gzip stream, one read at a time."""
+    inflater = zlib.decompressobj(GZIP_WBITS)
+    pending = False
+    while True:
+        data = fileobj.read(chunk_size)
+        if not data:
+            break
+        while data:
+            pending = True
+            out = inflater.decompress(data)
+            if out:
+                yield out
+            if not inflater.eof:
+                break
+            # The archive is several gzip members back to back.
+            data = inflater.unused_data
+            inflater = zlib.decompressobj(GZIP_WBITS)
+            pending = False
+    if pending:
+        raise EOFError("compressed stream ended before the end-of-stream marker")
+
+
+def iter_index_chunks(fileobj, chunk_size=CHUNK_SIZE):
+    """Yield the raw bytes of the ``APKINDEX`` member of a tar.gz stream.
+
+    *fileobj* is read one chunk at a time, typically straight from the
+    HTTP response: each chunk is inflated and the ``APKINDEX`` bytes it
+    yields are passed on at once, so download, decompression and parsing
+    overlap.  The signature and ``DESCRIPTION`` members are skipped without
+    being kept, and reading stops at the end of the ``APKINDEX`` member.
+    """
+    tar = _TarStream(_inflate(fileobj, chunk_size))
+    try:
+        found = yield from tar.find(INDEX_MEMBER.encode())
+    except (OSError, EOFError, zlib.error) as e:
+        raise IndexFormatError(f"cannot read APKINDEX archive: {e}") from None
+    if not found:
+        raise IndexFormatError(f"archive has no {INDEX_MEMBER} member")
+
+
+def iter_stanzas(chunks):
+    """Split a byte stream into blank-line separated stanzas.
+
+    Only the unterminated tail of the stream is buffered between chunks.
+    """
+    pending = bytearray()
+    for chunk in chunks:
+        # A separator may straddle the chunk boundary, so rescan one byte back.
+        search_from = max(len(pending) - 1, 0)
+        pending += chunk
+        start = 0
+        while True:
+            end = pending.find(STANZA_SEPARATOR, max(start, search_from))
+            if end < 0:
+                break
+            if end > start:
+                yield bytes(pending[start:end])
+            start = end + len(STANZA_SEPARATOR)
+        del pending[:start]
+    tail = bytes(pending).strip(b"\n")
+    if tail:
+        yield tail
+
+
+def parse_stanza(raw, start=0, end=None):
+    """Wrap one stanza in a lazily decoded :class:`Package`."""
+    pkg = Package.from_stanza(raw, start, end)
+    if pkg.name is None:
+        raise IndexFormatError("stanza without a P: field")
+    return pkg
+
+
+def is_plain_index(fileobj):
+    """Return whether *fileobj* is an uncompressed, already extracted APKINDEX."""
+    if not fileobj.seekable():
+        return False
+    head = fileobj.read(len(GZIP_MAGIC))
+    fileobj.seek(0)
+    return head != GZIP_MAGIC
+
+
+def map_index(fileobj):
+    """Memory-map the plain APKINDEX *fileobj*; ``None`` if it is empty.
+
+    The map outlives *fileobj*: packages parsed from it keep it alive
+    until the last of them is dropped.
+    """
+    try:
+        return mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        return None
+    except OSError as e:
+        raise IndexFormatError(f"cannot map APKINDEX: {e}") from None
+
+
+def iter_mapped_spans(data):
+    """Yield the ``(start, end)`` span of every stanza of a mapped index.
+
+    Boundaries are found with ``mmap.find`` over the whole file, so no
+    line is ever read or copied in Python.
+    """
+    size = len(data)
+    start = 0
+    while start < size:
+        end = data.find(STANZA_SEPARATOR, start)
+        if end < 0:
+            end = size
+            while end > start and data[end - 1] == 0x0A:
+                end -= 1
+        if end > start:
+            yield start, end
+        start = end + len(STANZA_SEPARATOR)
+
+
+def split_stanzas(data, parts):
+    """Cut *data* at stanza boundaries into at most *parts* spans of similar size.
+
+    Returns ``(start, end)`` pairs covering all of *data*; each cut is
+    placed at the first separator after an even share, so no stanza is
+    ever split between two spans.
+    """
+    size = len(data)
+    spans = []
+    start = 0
+    for i in range(1, parts):
+        cut = data.find(STANZA_SEPARATOR, max(start, size * i // parts))
+        if cut < 0:
+            break
+        cut += len(STANZA_SEPARATOR)
+        spans.append((start, cut))
+        start = cut
+    if start < size:
+        spans.append((start, size))
+    return spans
+
+
+def _iter_mapped_packages(fileobj):
+    data = map_index(fileobj)
+    if data is not None:
+        for start, end in iter_mapped_spans(data):
+            yield parse_stanza(data, start, end)
+
+
+def iter_packages(fileobj):
+    """Lazily yield every :class:`Package` of an ``APKINDEX.tar.gz`` stream.
+
+    A local, uncompressed APKINDEX is memory-mapped instead of streamed.
+    """
+    prof = profiling.get()
+    if is_plain_index(fileobj):
+        return prof.iter("parse", _iter_mapped_packages(fileobj), "stanzas")
+    chunks = prof.iter("decompress", iter_index_chunks(fileobj), "bytes", len)
+    return prof.iter("parse", map(parse_stanza, iter_stanzas(chunks)), "stanzas")
+
+
+def _stanza_names(raw, name):
+    marker = b"P:" + name.encode("utf-8") + b"\n"
+    return raw.startswith(marker) or (b"\n" + marker) in raw + b"\n"
+
+
+def _find_mapped(fileobj, name):
+    """Locate the ``P:`` line of *name* with one search over the whole map."""
+    data = map_index(fileobj)
+    if data is None:
+        return None
+    marker = b"P:" + name.encode("utf-8")
+    pos = data.find(marker)
+    while pos >= 0:
+        eol = pos + len(marker)
+        if (pos == 0 or data[pos - 1] == 0x0A) and (eol == len(data) or data[eol] == 0x0A):
+            start = data.rfind(STANZA_SEPARATOR, 0, pos)
+            start = 0 if start < 0 else start + len(STANZA_SEPARATOR)
+            end = data.find(STANZA_SEPARATOR, pos)
+            return parse_stanza(data, start, len(data) if end < 0 else end)
+        pos = data.find(marker, pos + 1)
+    return None
+
+
+def find_package(fileobj, name):
+    """Return the record of *name*, or ``None`` if the index lacks it.
+
+    Reading stops at the matching stanza; stanzas of other packages are
+    rejected with a byte search and never parsed.
+    """
+    prof = profiling.get()
+    if is_plain_index(fileobj):
+        with prof.stage("parse"):
+            return _find_mapped(fileobj, name)
+    chunks = prof.iter("decompress", iter_index_chunks(fileobj), "bytes", len)
+    for raw in prof.iter("parse", iter_stanzas(chunks), "stanzas"):
+        if _stanza_names(raw, name):
+            return parse_stanza(raw)
+    return None
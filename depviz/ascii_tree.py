@@ -0,0 +1,65 @@
+"""ASCII-tree output of a dependency graph.
+
+Lines are produced one at a time by an iterative depth-first walk and
+written as soon as they exist, so the first line appears immediately and
+the whole tree is never held in memory.
+"""
+
+import sys
+
+BRANCH = "├── "
+LAST = "└── "
+PIPE = "│   "
+SPACE = "    "
+
+
+def iter_tree_lines(edges, root, collapse=True):
+    """Yield the lines of the tree rooted at *root*.
+
+    *edges* maps a package to its dependencies.  With *collapse*, a package
+    whose subtree was already printed is shown once more as a ``(see above)``
+    back-reference, which keeps the output linear in the number of edges.
+    Without it every path is expanded; cycles are cut in both modes.
+    """
+    yield root
+    expanded = {root}
+    path = {root}
+    # Each frame: (package, prefix of its children, iterator over children).
+    stack = [(root, "", iter(_children(edges, root)))]
+    while stack:
+        name, prefix, children = stack[-1]
+        entry = next(children, None)
+        if entry is None:
+            stack.pop()
+            path.discard(name)
+            continue
+        dep, is_last = entry
+        connector = LAST if is_last else BRANCH
+        if dep in path:
+            yield f"{prefix}{connector}{dep} (cycle)"
+        elif collapse and dep in expanded and edges.get(dep):
+            yield f"{prefix}{connector}{dep} (see above)"
+        else:
+            yield f"{prefix}{connector}{dep}"
+            expanded.add(dep)
+            path.add(dep)
+            stack.append((dep, prefix + (SPACE if is_last else PIPE),
+                          iter(_children(edges, dep))))
+
+
+def _children(edges, name):
+    deps = edges.get(name, ())
+    last = len(deps) - 1
+    for i, dep in enumerate(deps):
+        yield dep, i == last
+
+
+def write_tree(edges, root, file=None, collapse=True):
+    """Stream the tree to *file* (stdout by default); return the line count."""
+    if file is None:
+        file = sys.stdout
+    count = 0
+    for line in iter_tree_lines(edges, root, collapse):
+        file.write(line + "\n")
+        count += 1
+    return count
@@ -0,0 +1,202 @@
+"""Compact binary snapshot of a parsed APKINDEX.
+
+Parsing the text index is only needed once per archive: the package table
+is then written into a binary file that later runs memory-map and query in
+constant time.  Layout (all integers little-endian ``uint32``)::
+
+    header   magic, archive SHA-256, counts
+    records  name, version, C: checksum (offset, length into strings),
+             depends, provides (start, count into refs)
+    refs     (offset, length) pairs into strings
+    slots    open-addressing hash table of record number + 1, 0 = empty
+    strings  UTF-8 blob, every distinct string stored once
+
+There is one file per source archive, named after the archive's path, so
+a new upstream index replaces its predecessor's snapshot instead of adding
+another.  The header records the SHA-256 of the archive it was built from,
+so a stale snapshot is detected and rebuilt.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+
+from .apkindex import Package
+from .errors import IndexFormatError
+
+MAGIC = b"DVZIDX02"
+HEADER = struct.Struct("<8s32sIIII")
+RECORD = struct.Struct("<10I")
+REF = struct.Struct("<II")
+SLOT = struct.Struct("<I")
+SUFFIX = ".idx"
+
+
+def archive_checksum(fileobj, chunk_size=256 * 1024):
+    """Return the SHA-256 of a seekable file and rewind it."""
+    digest = hashlib.sha256()
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.digest()
+
+
+def index_path(directory, source):
+    """Return the snapshot path for the archive at path *source*."""
+    key = hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()
+    return os.path.join(directory, key + SUFFIX)
+
+
+def _slot_count(n):
+    size = 8
+    while size < 2 * n:
+        size <<= 1
+    return size
+
+
+def _tobytes(arr):
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def write_index(path, checksum, packages):
+    """Serialize *packages* into a binary index at *path*."""
+    blob = bytearray()
+    offsets = {}
+
+    def intern(s):
+        ref = offsets.get(s)
+        if ref is None:
+            data = s.encode("utf-8")
+            ref = offsets[s] = (len(blob), len(data))
+            blob.extend(data)
+        return ref
+
+    records = array("I")
+    refs = array("I")
+    names = []
+    for pkg in packages:
+        names.append(pkg.name.encode("utf-8"))
+        record = [*intern(pkg.name), *intern(pkg.version), *intern(pkg.checksum or "")]
+        for values in (pkg.depends, pkg.provides):
+            record += (len(refs) // 2, len(values))
+            for value in values:
+                refs.extend(intern(value))
+        records.extend(record)
+
+    n_slots = _slot_count(len(names))
+    mask = n_slots - 1
+    slots = array("I", [0]) * n_slots
+    seen = set()
+    for i, name in enumerate(names):
+        # Like the text index, the first stanza of a name wins.
+        if name in seen:
+            continue
+        seen.add(name)
+        h = zlib.crc32(name) & mask
+        while slots[h]:
+            h = (h + 1) & mask
+        slots[h] = i + 1
+
+    header = HEADER.pack(MAGIC, checksum, len(names), len(refs) // 2, n_slots, len(blob))
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for part in (header, _tobytes(records), _tobytes(refs), _tobytes(slots), blob):
+                f.write(part)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class BinaryIndex:
+    """Read-only, memory-mapped view of a file produced by :func:`write_index`."""
+
+    def __init__(self, path, checksum=None):
+        try:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise IndexFormatError(f"cannot map binary index {path}: {e}") from None
+        try:
+            magic, stored, self._count, n_refs, self._n_slots, n_strings = \
+                HEADER.unpack_from(self._map)
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            self.close()
+            raise IndexFormatError(f"{path} is not a binary index")
+        if checksum is not None and stored != checksum:
+            self.close()
+            raise IndexFormatError(f"{path} was built from a different archive")
+        self._records = HEADER.size
+        self._refs = self._records + self._count * RECORD.size
+        self._slots = self._refs + n_refs * REF.size
+        self._strings = self._slots + self._n_slots * SLOT.size
+        if len(self._map) != self._strings + n_strings:
+            self.close()
+            raise IndexFormatError(f"{path} is truncated")
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def _bytes(self, offset, length):
+        start = self._strings + offset
+        return self._map[start:start + length]
+
+    def _list(self, start, count):
+        base = self._refs + start * REF.size
+        return [self._bytes(*REF.unpack_from(self._map, base + i * REF.size)).decode("utf-8")
+                for i in range(count)]
+
+    def _package(self, i):
+        (name_off, name_len, ver_off, ver_len, sum_off, sum_len,
+         dep_start, dep_count, prov_start, prov_count) = \
+            RECORD.unpack_from(self._map, self._records + i * RECORD.size)
+        return Package(
+            self._bytes(name_off, name_len).decode("utf-8"),
+            self._bytes(ver_off, ver_len).decode("utf-8"),
+            self._list(dep_start, dep_count),
+            self._list(prov_start, prov_count),
+            self._bytes(sum_off, sum_len).decode("utf-8") or None,
+        )
+
+    def get(self, name):
+        """Return the :class:`Package` named *name*, or ``None``."""
+        key = name.encode("utf-8")
+        mask = self._n_slots - 1
+        h = zlib.crc32(key) & mask
+        while True:
+            (entry,) = SLOT.unpack_from(self._map, self._slots + h * SLOT.size)
+            if not entry:
+                return None
+            i = entry - 1
+            name_off, name_len = struct.unpack_from("<II", self._map, self._records + i * RECORD.size)
+            if self._bytes(name_off, name_len) == key:
+                return self._package(i)
+            h = (h + 1) & mask
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._package(i)
@@ -0,0 +1,77 @@
+"""On-disk cache of downloaded index archives.
+
+Every cached URL is stored as two files named after the SHA-1 of the URL:
+the raw archive (``.tar.gz``) and its HTTP validators (``.json``) used to
+issue conditional requests on the next run.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from .errors import RepositoryError
+
+COPY_BUFFER = 256 * 1024
+
+
+class IndexCache:
+    def __init__(self, directory):
+        self.directory = directory
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            raise RepositoryError(f"cannot create cache directory {directory}: {e.strerror}") from None
+
+    def _base(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+    def archive_path(self, url):
+        return self._base(url) + ".tar.gz"
+
+    def validators(self, url):
+        """Return request headers that make a fetch of *url* conditional."""
+        if not os.path.exists(self.archive_path(url)):
+            return {}
+        try:
+            with open(self._base(url) + ".json", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def open(self, url):
+        return open(self.archive_path(url), "rb")
+
+    def store(self, url, response, headers=None):
+        """Copy the body of *response* into the cache and record its validators.
+
+        *headers* defaults to ``response.headers``; any mapping with a
+        case-insensitive ``get`` such as :class:`http.client.HTTPMessage` works.
+
+        The archive is written to a temporary file and renamed into place, so
+        an interrupted download never leaves a truncated entry behind.
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(response, out, COPY_BUFFER)
+            os.replace(tmp, self.archive_path(url))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if headers is None:
+            headers = response.headers
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+        with open(self._base(url) + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
@@ -0,0 +1,145 @@
+"""Command-line entry point."""
+
+import argparse
+import sys
+import time
+from dataclasses import replace
+
+from . import profiling
+from .ascii_tree import write_tree
+from .collector import Collector, direct_dependencies
+from .config import load_config
+from .errors import DepvizError
+from .prune import simplify, transitive_reduction
+from .render import PackedGraph, RenderJob, image_paths, render_many
+from .server import serve
+
+DEFAULT_CONFIG = "config.json"
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="depviz",
+        description="Dependency graph visualizer for Alpine Linux (apk) packages.",
+    )
+    parser.add_argument("-c", "--config", default=DEFAULT_CONFIG,
+                        help=f"path to the JSON configuration file (default: {DEFAULT_CONFIG})")
+    parser.add_argument("--show-config", action="store_true",
+                        help="print the loaded parameters as key=value and exit")
+    parser.add_argument("--transitive", action="store_true",
+                        help="print the full dependency closure instead of direct dependencies")
+    parser.add_argument("--reverse", action="store_true",
+                        help="print every package that depends on the root, transitively")
+    parser.add_argument("--serve", action="store_true",
+                        help="load the repositories once and answer queries over HTTP "
+                             "(see the 'serve' config section)")
+    parser.add_argument("--profile", action="store_true",
+                        help="print per-stage timings and counters to stderr")
+    parser.add_argument("--profile-json", metavar="FILE",
+                        help="also write the per-stage report as JSON to FILE")
+    return parser
+
+
+def _print_graph(graph, config):
+    if config.transitive_reduction:
+        graph = transitive_reduction(graph)
+    if config.ascii_tree:
+        prof = profiling.get()
+        with prof.stage("render"):
+            lines = write_tree(graph.edges, graph.root, collapse=config.collapse_repeated)
+        prof.count("render", "lines", lines)
+    else:
+        for name, deps in graph.edges.items():
+            print(f"{name}: {' '.join(deps)}")
+    print(graph.summary(), file=sys.stderr)
+
+
+def _render_images(graphs, config):
+    """Write the configured image files for *graphs*; return the exit status."""
+    batch = len(config.packages) > 1
+    jobs = []
+    for graph in graphs:
+        graph = simplify(graph, config.max_depth, config.collapse_in_degree,
+                         config.transitive_reduction)
+        packed = PackedGraph.pack(graph)
+        for path in image_paths(config.output_image, graph.root, config.image_formats, batch):
+            jobs.append(RenderJob(packed, path, config.layout_engine))
+    prof = profiling.get()
+    with prof.stage("render"):
+        results = render_many(jobs, config.render_workers)
+    prof.count("render", "images", len(results))
+    status = 0
+    for result in results:
+        if result.error:
+            print(f"error: {result.root}: {result.error}", file=sys.stderr)
+            status = 1
+        else:
+            print(f"wrote {result.path}", file=sys.stderr)
+    return status
+
+
+def execute(config, args):
+    roots = config.packages
+    reverse = config.reverse or args.reverse
+    show_graph = config.ascii_tree or args.transitive or reverse
+    if len(roots) == 1 and not (show_graph or config.generate_image):
+        for dep in direct_dependencies(config):
+            print(dep)
+        return 0
+
+    # Batch mode (or a full closure): one index and one resolver for all roots.
+    collector = Collector(config)
+    status = 0
+    graphs = []
+    for i, root in enumerate(roots):
+        try:
+            if show_graph or config.generate_image:
+                graph = collector.reverse_graph(root) if reverse else collector.graph(root)
+                graphs.append(graph)
+            if show_graph:
+                if len(roots) > 1 and i:
+                    print()
+                _print_graph(graph, config)
+            elif len(roots) > 1:
+                print(f"{root}: {' '.join(collector.direct_dependencies(root))}")
+            else:
+                for dep in collector.direct_dependencies(root):
+                    print(dep)
+        except DepvizError as e:
+            print(f"error: {e}", file=sys.stderr)
+            status = 1
+    if config.generate_image and graphs:
+        status = _render_images(graphs, config) or status
+    return status
+
+
+def run(args):
+    started = time.perf_counter()
+    config = load_config(args.config)
+    elapsed = {"config": time.perf_counter() - started}
+    if args.show_config:
+        for key, value in config.items():
+            print(f"{key}={value}")
+        return 0
+    if args.serve:
+        return serve(config)
+    options = config.profile
+    if args.profile or args.profile_json:
+        options = replace(options, enabled=True, json=args.profile_json or options.json)
+    if not (options.enabled or options.cprofile or options.tracemalloc):
+        return execute(config, args)
+    with profiling.session(options, elapsed):
+        return execute(config, args)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return run(args)
+    except DepvizError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
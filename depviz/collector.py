@@ -0,0 +1,244 @@
+"""Stage 2: collecting dependency data for the configured package."""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from . import aiorepository, apkindex, binindex, profiling, repository
+from .cache import IndexCache
+from .errors import IndexFormatError, RepositoryError
+from .graph import Resolver
+from .provides import ProvidesIndex, index_parallel, index_text
+from .testrepo import load_test_repository
+
+# Smaller chunks cost more in process hand-off and merging than they save.
+MIN_CHUNK_BYTES = 1 << 20
+
+
+def _open_snapshot(f, cache_dir):
+    """Return the binary snapshot of archive *f*, building it on first use."""
+    checksum = binindex.archive_checksum(f)
+    path = binindex.index_path(cache_dir, f.name)
+    if os.path.exists(path):
+        try:
+            index = binindex.BinaryIndex(path, checksum)
+        except IndexFormatError:
+            pass  # stale, corrupt or foreign file: replace it below
+        else:
+            profiling.get().count("parse", "snapshot_hits")
+            return index
+    binindex.write_index(path, checksum, apkindex.iter_packages(f))
+    return binindex.BinaryIndex(path, checksum)
+
+
+def _cache(config):
+    return IndexCache(config.cache_dir) if config.cache_dir else None
+
+
+def _read_packages(f, config):
+    """Return every package of one open index archive as a list."""
+    if config.cache_dir is None or not f.seekable():
+        return list(apkindex.iter_packages(f))
+    with _open_snapshot(f, config.cache_dir) as index:
+        return list(profiling.get().iter("parse", index, "records"))
+
+
+def _index_chunks(f, config, pool, workers):
+    """Index one open index archive on process *pool*; return its :class:`IndexChunk` list.
+
+    The decompressed text is cut into up to *workers* stanza-aligned chunks
+    of at least :data:`MIN_CHUNK_BYTES`; an index too small to split is
+    indexed in this process.
+    """
+    if config.cache_dir is not None and f.seekable():
+        # Binary snapshots need no parsing.
+        return [ProvidesIndex(_read_packages(f, config)).chunk()]
+    prof = profiling.get()
+    if apkindex.is_plain_index(f):
+        data = apkindex.map_index(f) or b""
+    else:
+        data = b"".join(prof.iter("decompress", apkindex.iter_index_chunks(f), "bytes", len))
+    parts = min(workers, len(data) // MIN_CHUNK_BYTES)
+    with prof.stage("parse"):
+        if parts < 2:
+            return [index_text(data)]
+        prof.count("parse", "chunks", parts)
+        return index_parallel(data, pool, parts)
+
+
+def _find_in(f, config, name):
+    """Return the record of package *name* in one open archive, or ``None``."""
+    if config.cache_dir is None or not f.seekable():
+        return apkindex.find_package(f, name)
+    with _open_snapshot(f, config.cache_dir) as index, profiling.get().stage("parse"):
+        return index.get(name)
+
+
+def _map_repositories(func, config, *args):
+    """Apply *func* to the index archive of every configured repository.
+
+    Archives are fetched concurrently, either by a thread pool or, with
+    ``async_fetch``, over one event loop.  Results come back in
+    configuration order, which is the merge priority.  Only the thread
+    pool parses an uncached archive while it downloads; the event loop
+    spools every body to disk first.
+    """
+    prof = profiling.get()
+    cache = _cache(config)
+    locations = config.repositories
+    if config.async_fetch:
+        with prof.stage("fetch"):
+            files = aiorepository.open_indexes(locations, cache, config.workers)
+        results = []
+        for f in files:
+            with prof.reader("fetch", f) as f:
+                results.append(func(f, config, *args))
+        return results
+
+    def fetch(location):
+        with prof.stage("fetch"):
+            f = repository.open_index(location, cache)
+        with prof.reader("fetch", f) as f:
+            return func(f, config, *args)
+
+    if len(locations) == 1:
+        return [fetch(locations[0])]
+    with ThreadPoolExecutor(max_workers=min(config.workers, len(locations))) as pool:
+        return list(pool.map(fetch, locations))
+
+
+def _not_found(config, name):
+    return RepositoryError(f"package {name!r} not found in {', '.join(config.repositories)}")
+
+
+def load_index(config):
+    """Load every package of the configured repositories into a :class:`ProvidesIndex`.
+
+    The returned object is shared by the collector and the graph builder so
+    the repositories are read and indexed once per run.  When several
+    repositories carry the same package, the one listed first wins.  In
+    test mode the :class:`~depviz.testrepo.TestRepository` itself is returned.
+
+    With ``parse_workers`` other than 1, large indexes are parsed and
+    indexed in chunks on a process pool and the chunks merged in order.
+    """
+    prof = profiling.get()
+    if config.test_mode:
+        with prof.stage("parse"):
+            return load_test_repository(config.repositories[0])
+    if config.parse_workers == 1:
+        results = _map_repositories(_read_packages, config)
+        with prof.stage("index"):
+            index = ProvidesIndex()
+            for packages in results:
+                for pkg in packages:
+                    index.add(pkg)
+    else:
+        with ProcessPoolExecutor(max_workers=config.parse_workers) as pool:
+            results = _map_repositories(_index_chunks, config, pool, config.parse_workers)
+        with prof.stage("index"):
+            index = ProvidesIndex()
+            for chunks in results:
+                for chunk in chunks:
+                    index.merge(chunk)
+    prof.count("index", "packages", len(index))
+    return index
+
+
+def find_package(config, name=None):
+    """Return the record of package *name* (the configured root by default).
+
+    Only the stanza of that package is parsed; see :class:`Collector` for
+    looking up many packages against one loaded index.
+    """
+    if name is None:
+        name = config.packages[0]
+    if config.test_mode:
+        with profiling.get().stage("parse"):
+            pkg = load_test_repository(config.repositories[0]).get(name)
+        if pkg is None:
+            raise _not_found(config, name)
+        return pkg
+    for pkg in _map_repositories(_find_in, config, name):
+        if pkg is not None:
+            return pkg
+    raise _not_found(config, name)
+
+
+def _requirements(pkg):
+    # "!name" tokens are conflicts, not dependencies; the graph skips them too.
+    return [token for token in pkg.depends if not token.startswith("!")]
+
+
+def direct_dependencies(config, name=None):
+    """Return the direct dependencies of package *name* as listed in ``D:``, minus conflicts."""
+    return _requirements(find_package(config, name))
+
+
+class Collector:
+    """Answers queries for many root packages from one loaded index.
+
+    The index is read once and all closures share one :class:`Resolver`, so
+    subgraphs common to several roots are resolved only once.
+    """
+
+    def __init__(self, config, index=None):
+        self.config = config
+        self.index = load_index(config) if index is None else index
+        self.resolver = Resolver(self.index)
+
+    def package(self, name):
+        pkg = self.index.package(name)
+        if pkg is None:
+            raise _not_found(self.config, name)
+        return pkg
+
+    def direct_dependencies(self, name):
+        return _requirements(self.package(name))
+
+    def changes(self):
+        """Re-read the repositories and return their :class:`~depviz.provides.IndexChanges`.
+
+        The loaded index is not modified; pass the result to :meth:`apply`.
+        """
+        if self.config.test_mode:
+            raise RepositoryError("incremental refresh needs APKINDEX repositories")
+        results = _map_repositories(_read_packages, self.config)
+        with profiling.get().stage("diff"):
+            return self.index.diff(pkg for packages in results for pkg in packages)
+
+    def apply(self, changes):
+        """Update the index with *changes* and drop the closures they reach."""
+        with profiling.get().stage("index"):
+            self.index.apply(changes)
+            started = time.perf_counter()
+            changes.dropped = self.resolver.invalidate(changes.affected)
+            changes.elapsed += time.perf_counter() - started
+        return changes
+
+    def refresh(self):
+        """Bring the loaded index up to date with the repositories."""
+        return self.apply(self.changes())
+
+    def _resolve(self, name, closure):
+        if name not in self.index:
+            raise _not_found(self.config, name)
+        prof = profiling.get()
+        with prof.stage("resolve"):
+            graph = closure(name)
+        prof.count("resolve", "nodes", graph.node_count)
+        prof.count("resolve", "edges", graph.edge_count)
+        return graph
+
+    def graph(self, name):
+        """Return the transitive :class:`~depviz.graph.DependencyGraph` of *name*."""
+        return self._resolve(name, self.resolver.closure)
+
+    def reverse_graph(self, name):
+        """Return the :class:`~depviz.graph.DependencyGraph` of the packages needing *name*."""
+        return self._resolve(name, self.resolver.reverse_closure)
+
+
+def dependency_graph(config, index=None):
+    """Return the transitive :class:`~depviz.graph.DependencyGraph` of the configured root."""
+    return Collector(config, index).graph(config.packages[0])
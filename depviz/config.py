@@ -0,0 +1,355 @@
+"""Loading and validation of the JSON configuration file."""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field, fields
+from urllib.parse import urlparse
+
+from .errors import ConfigError
+
+PACKAGE_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9+._-]*$")
+IMAGE_EXTENSIONS = (".png", ".svg", ".pdf", ".jpg", ".jpeg")
+DEFAULT_WORKERS = 4
+LAYOUT_ENGINES = ("auto", "graphviz", "native")
+DEFAULT_SERVE_PORT = 8765
+_REQUIRED = object()
+
+
+@dataclass
+class ProfileOptions:
+    """The ``profile`` section: per-stage instrumentation and optional captures."""
+
+    enabled: bool = False
+    json: str = None
+    cprofile: str = None
+    tracemalloc: bool = False
+
+
+@dataclass
+class ServeOptions:
+    """The ``serve`` section: where ``depviz --serve`` listens and how often it reloads."""
+
+    host: str = "127.0.0.1"
+    port: int = DEFAULT_SERVE_PORT
+    socket: str = None
+    refresh_interval: float = None
+
+
+@dataclass
+class Config:
+    package: object
+    repository: object
+    test_mode: bool = False
+    output_image: str = "graph.png"
+    ascii_tree: bool = False
+    collapse_repeated: bool = True
+    cache_dir: str = None
+    workers: int = DEFAULT_WORKERS
+    async_fetch: bool = False
+    profile: ProfileOptions = field(default_factory=ProfileOptions)
+    packages_file: str = None
+    generate_image: bool = False
+    image_formats: list = None
+    render_workers: int = None
+    parse_workers: int = 1
+    layout_engine: str = "auto"
+    max_depth: int = None
+    collapse_in_degree: int = None
+    transitive_reduction: bool = False
+    reverse: bool = False
+    serve: ServeOptions = field(default_factory=ServeOptions)
+
+    @property
+    def packages(self):
+        """Root packages to process, in order (a list in batch mode)."""
+        if isinstance(self.package, list):
+            return self.package
+        return [self.package]
+
+    @property
+    def repositories(self):
+        """Repository locations in priority order (first match wins)."""
+        if isinstance(self.repository, list):
+            return self.repository
+        return [self.repository]
+
+    def items(self):
+        for f in fields(self):
+            yield f.name, getattr(self, f.name)
+
+
+def _require(data, key, kind, default=_REQUIRED):
+    if key not in data:
+        if default is _REQUIRED:
+            raise ConfigError(f"missing required key '{key}'")
+        return default
+    value = data[key]
+    if value is None and default is None:
+        # An explicit null spells out the default of an optional key.
+        return None
+    # bool is a subclass of int, so it has to be rejected explicitly.
+    if not isinstance(value, kind) or (kind is not bool and isinstance(value, bool)):
+        raise ConfigError(f"'{key}' must be of type {kind.__name__}, got {type(value).__name__}")
+    return value
+
+
+def _check_packages(value, packages_file):
+    """Merge the ``package`` value and the names in ``packages_file``.
+
+    Returns a string for a single root and a de-duplicated list otherwise.
+    """
+    if value is None and packages_file is None:
+        raise ConfigError("missing required key 'package'")
+    names = []
+    if isinstance(value, str):
+        names.append(_check_package(value))
+    elif isinstance(value, list):
+        if not value:
+            raise ConfigError("'package' list must not be empty")
+        for item in value:
+            if not isinstance(item, str):
+                raise ConfigError(f"'package' entries must be strings, got {type(item).__name__}")
+            names.append(_check_package(item))
+    elif value is not None:
+        raise ConfigError("'package' must be a string or a list of strings")
+    if packages_file is not None:
+        names.extend(_read_packages_file(packages_file))
+    names = list(dict.fromkeys(names))
+    if not names:
+        raise ConfigError(f"no package names in {packages_file}")
+    if len(names) == 1 and not isinstance(value, list):
+        return names[0]
+    return names
+
+
+def _read_packages_file(path):
+    """Read one package name per line; blank lines and ``#`` comments are skipped."""
+    if not isinstance(path, str) or not path:
+        raise ConfigError("'packages_file' must be a non-empty string")
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = [line.split("#", 1)[0].strip() for line in f]
+    except OSError as e:
+        raise ConfigError(f"cannot read packages file {path}: {e.strerror}") from None
+    names = []
+    for lineno, line in enumerate(lines, 1):
+        if not line:
+            continue
+        try:
+            names.append(_check_package(line))
+        except ConfigError as e:
+            raise ConfigError(f"{path}:{lineno}: {e}") from None
+    return names
+
+
+def _check_package(name):
+    if not name:
+        raise ConfigError("'package' must not be empty")
+    if not PACKAGE_NAME_RE.match(name):
+        raise ConfigError(f"'package' has invalid characters: {name!r}")
+    return name
+
+
+def _check_repositories(value, test_mode):
+    if value is None:
+        raise ConfigError("missing required key 'repository'")
+    if isinstance(value, str):
+        return _check_repository(value, test_mode)
+    if not isinstance(value, list) or not value:
+        raise ConfigError("'repository' must be a string or a non-empty list of strings")
+    if test_mode and len(value) > 1:
+        raise ConfigError("test mode accepts a single repository file")
+    for item in value:
+        if not isinstance(item, str):
+            raise ConfigError(f"'repository' entries must be strings, got {type(item).__name__}")
+        _check_repository(item, test_mode)
+    if len(set(value)) != len(value):
+        raise ConfigError("'repository' lists the same location twice")
+    return value
+
+
+def _check_repository(repository, test_mode):
+    if not repository:
+        raise ConfigError("'repository' must not be empty")
+    if test_mode:
+        if not os.path.isfile(repository):
+            raise ConfigError(f"test repository file not found: {repository}")
+        return repository
+    scheme = urlparse(repository).scheme
+    if scheme in ("http", "https"):
+        return repository
+    if scheme and len(scheme) > 1:
+        raise ConfigError(f"unsupported repository URL scheme: {scheme}")
+    if not os.path.exists(repository):
+        raise ConfigError(f"repository path does not exist: {repository}")
+    return repository
+
+
+def _check_image(path):
+    if not path:
+        raise ConfigError("'output_image' must not be empty")
+    if not path.lower().endswith(IMAGE_EXTENSIONS):
+        raise ConfigError(
+            f"'output_image' must end with one of {', '.join(IMAGE_EXTENSIONS)}: {path}"
+        )
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        raise ConfigError(f"directory for 'output_image' does not exist: {directory}")
+    return path
+
+
+def _check_cache_dir(path):
+    if path is None:
+        return None
+    if not isinstance(path, str) or not path:
+        raise ConfigError("'cache_dir' must be a non-empty string or null")
+    if os.path.exists(path) and not os.path.isdir(path):
+        raise ConfigError(f"'cache_dir' is not a directory: {path}")
+    return path
+
+
+def _check_workers(value, key="workers"):
+    if value is None:
+        return None
+    if value < 1:
+        raise ConfigError(f"'{key}' must be at least 1, got {value}")
+    return value
+
+
+def _check_engine(value):
+    if value not in LAYOUT_ENGINES:
+        raise ConfigError(
+            f"'layout_engine' must be one of {', '.join(LAYOUT_ENGINES)}: {value!r}"
+        )
+    return value
+
+
+def _check_limit(key, value, minimum):
+    if value is not None and value < minimum:
+        raise ConfigError(f"'{key}' must be at least {minimum}, got {value}")
+    return value
+
+
+def _check_formats(value):
+    if value is None:
+        return None
+    if not isinstance(value, list) or not value:
+        raise ConfigError("'image_formats' must be a non-empty list")
+    allowed = [ext.lstrip(".") for ext in IMAGE_EXTENSIONS]
+    for fmt in value:
+        if not isinstance(fmt, str) or fmt.lower() not in allowed:
+            raise ConfigError(f"'image_formats' entries must be one of {', '.join(allowed)}: {fmt!r}")
+    return list(dict.fromkeys(fmt.lower() for fmt in value))
+
+
+def _check_output_path(section, key, value):
+    if value is None:
+        return None
+    if not isinstance(value, str) or not value:
+        raise ConfigError(f"'{section}.{key}' must be a non-empty string or null")
+    directory = os.path.dirname(value)
+    if directory and not os.path.isdir(directory):
+        raise ConfigError(f"directory for '{section}.{key}' does not exist: {directory}")
+    return value
+
+
+def _check_profile(value):
+    """``profile`` is either a boolean or an object of :class:`ProfileOptions` keys."""
+    if value is None or isinstance(value, bool):
+        return ProfileOptions(enabled=bool(value))
+    if not isinstance(value, dict):
+        raise ConfigError("'profile' must be a boolean or an object")
+    known = {f.name for f in fields(ProfileOptions)}
+    unknown = sorted(set(value) - known)
+    if unknown:
+        raise ConfigError(f"unknown keys in 'profile': {', '.join(unknown)}")
+    for key in ("enabled", "tracemalloc"):
+        if key in value and not isinstance(value[key], bool):
+            raise ConfigError(f"'profile.{key}' must be a boolean")
+    return ProfileOptions(
+        enabled=value.get("enabled", True),
+        json=_check_output_path("profile", "json", value.get("json")),
+        cprofile=_check_output_path("profile", "cprofile", value.get("cprofile")),
+        tracemalloc=value.get("tracemalloc", False),
+    )
+
+
+def _check_serve(value):
+    """``serve`` is an object of :class:`ServeOptions` keys."""
+    if value is None:
+        return ServeOptions()
+    if not isinstance(value, dict):
+        raise ConfigError("'serve' must be an object")
+    known = {f.name for f in fields(ServeOptions)}
+    unknown = sorted(set(value) - known)
+    if unknown:
+        raise ConfigError(f"unknown keys in 'serve': {', '.join(unknown)}")
+    host = value.get("host", "127.0.0.1")
+    if not isinstance(host, str) or not host:
+        raise ConfigError("'serve.host' must be a non-empty string")
+    port = value.get("port", DEFAULT_SERVE_PORT)
+    if not isinstance(port, int) or isinstance(port, bool) or not 0 <= port <= 65535:
+        raise ConfigError(f"'serve.port' must be an integer from 0 to 65535, got {port!r}")
+    interval = value.get("refresh_interval")
+    if interval is not None and (not isinstance(interval, (int, float))
+                                 or isinstance(interval, bool) or interval <= 0):
+        raise ConfigError(f"'serve.refresh_interval' must be a positive number of seconds "
+                          f"or null, got {interval!r}")
+    return ServeOptions(
+        host=host,
+        port=port,
+        socket=_check_output_path("serve", "socket", value.get("socket")),
+        refresh_interval=interval,
+    )
+
+
+def parse_config(data):
+    """Validate a decoded JSON object and build a :class:`Config`."""
+    if not isinstance(data, dict):
+        raise ConfigError("configuration root must be a JSON object")
+    known = {f.name for f in fields(Config)}
+    unknown = sorted(set(data) - known)
+    if unknown:
+        raise ConfigError(f"unknown keys: {', '.join(unknown)}")
+
+    test_mode = _require(data, "test_mode", bool, False)
+    return Config(
+        package=_check_packages(data.get("package"), data.get("packages_file")),
+        repository=_check_repositories(data.get("repository"), test_mode),
+        test_mode=test_mode,
+        output_image=_check_image(_require(data, "output_image", str, "graph.png")),
+        ascii_tree=_require(data, "ascii_tree", bool, False),
+        collapse_repeated=_require(data, "collapse_repeated", bool, True),
+        cache_dir=_check_cache_dir(data.get("cache_dir")),
+        workers=_check_workers(_require(data, "workers", int, DEFAULT_WORKERS)),
+        async_fetch=_require(data, "async_fetch", bool, False),
+        profile=_check_profile(data.get("profile")),
+        packages_file=data.get("packages_file"),
+        generate_image=_require(data, "generate_image", bool, False),
+        image_formats=_check_formats(data.get("image_formats")),
+        render_workers=_check_workers(_require(data, "render_workers", int, None),
+                                      "render_workers"),
+        parse_workers=_check_workers(_require(data, "parse_workers", int, 1), "parse_workers"),
+        layout_engine=_check_engine(_require(data, "layout_engine", str, "auto")),
+        max_depth=_check_limit("max_depth", _require(data, "max_depth", int, None), 0),
+        collapse_in_degree=_check_limit(
+            "collapse_in_degree", _require(data, "collapse_in_degree", int, None), 2),
+        transitive_reduction=_require(data, "transitive_reduction", bool, False),
+        reverse=_require(data, "reverse", bool, False),
+        serve=_check_serve(data.get("serve")),
+    )
+
+
+def load_config(path):
+    """Read the JSON file at *path* and return a validated :class:`Config`."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        raise ConfigError(f"configuration file not found: {path}") from None
+    except json.JSONDecodeError as e:
+        raise ConfigError(f"invalid JSON in {path}: {e}") from None
+    except OSError as e:
+        raise ConfigError(f"cannot read {path}: {e.strerror}") from None
+    return parse_config(data)
@@ -0,0 +1,21 @@
+"""Exception hierarchy shared by all stages of the tool."""
+
+
+class DepvizError(Exception):
+    """Base class for every error reported to the user by the CLI."""
+
+
+class ConfigError(DepvizError):
+    """The configuration file is missing, malformed or has a bad value."""
+
+
+class RepositoryError(DepvizError):
+    """The repository (remote or local) could not be read."""
+
+
+class IndexFormatError(DepvizError):
+    """The APKINDEX archive or a test repository file is malformed."""
+
+
+class RenderError(DepvizError):
+    """An image of the dependency graph could not be produced."""
@@ -0,0 +1,97 @@
+"""Generator of synthetic test repository files for load testing.
+
+Usage::
+
+    python -m depviz.gen_testrepo -n 1000000 -d 4 --shape dag repo.txt
+
+Packages are named ``P0`` .. ``P<n-1>``; ``P0`` is always the root and every
+edge points to a higher-numbered package, so all shapes except ``cyclic``
+are acyclic.
+"""
+
+import argparse
+import random
+import sys
+
+SHAPES = ("dag", "tree", "chain", "layered", "cyclic")
+
+
+def _dag(n, degree, rng):
+    for i in range(n):
+        upper = n - i - 1
+        k = min(upper, rng.randint(0, 2 * degree))
+        yield i, sorted(rng.sample(range(i + 1, n), k)) if k else []
+
+
+def _tree(n, degree, rng):
+    for i in range(n):
+        first = i * degree + 1
+        yield i, list(range(first, min(first + degree, n)))
+
+
+def _chain(n, degree, rng):
+    for i in range(n):
+        yield i, [i + 1] if i + 1 < n else []
+
+
+def _layered(n, degree, rng):
+    # Ten-ish layers; each package depends on random packages of the next
+    # layer, the typical "wide and shallow" shape of real distributions.
+    width = max(1, n // 10)
+    for i in range(n):
+        lo = (i // width + 1) * width
+        hi = min(lo + width, n)
+        k = min(degree, hi - lo) if lo < n else 0
+        yield i, sorted(rng.sample(range(lo, hi), k)) if k > 0 else []
+
+
+def _cyclic(n, degree, rng):
+    for i, deps in _dag(n, degree, rng):
+        if i and rng.random() < 0.01:
+            deps.append(rng.randrange(i))
+        yield i, deps
+
+
+GENERATORS = {
+    "dag": _dag,
+    "tree": _tree,
+    "chain": _chain,
+    "layered": _layered,
+    "cyclic": _cyclic,
+}
+
+
+def generate(out, packages, degree=3, shape="dag", seed=0):
+    """Write a test repository of the given size and shape; return the edge count."""
+    rng = random.Random(seed)
+    edges = 0
+    for i, deps in GENERATORS[shape](packages, degree, rng):
+        edges += len(deps)
+        out.write(f"P{i}: {' '.join(f'P{d}' for d in deps)}\n")
+    return edges
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m depviz.gen_testrepo",
+                                     description="Generate a synthetic test repository file.")
+    parser.add_argument("output", help="file to write ('-' for stdout)")
+    parser.add_argument("-n", "--packages", type=int, default=1000, help="number of packages")
+    parser.add_argument("-d", "--degree", type=int, default=3,
+                        help="average (dag, cyclic) or exact (tree, layered) fan-out")
+    parser.add_argument("--shape", choices=SHAPES, default="dag")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.packages < 1 or args.degree < 0:
+        parser.error("--packages must be positive and --degree non-negative")
+
+    if args.output == "-":
+        edges = generate(sys.stdout, args.packages, args.degree, args.shape, args.seed)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            edges = generate(f, args.packages, args.degree, args.shape, args.seed)
+    print(f"{args.packages} packages, {edges} edges", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""Transitive dependency closure over a :class:`~depviz.provides.ProvidesIndex`."""
+
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class DependencyGraph:
+    """Closure of one root package.
+
+    ``edges`` maps every reachable package to its resolved dependencies in
+    ``D:`` order; ``missing`` holds names no package provides and
+    ``cycles`` the back edges found while walking the graph.  A ``reverse``
+    graph maps packages to their dependents instead.
+    """
+
+    root: str
+    edges: dict = field(default_factory=dict)
+    missing: set = field(default_factory=set)
+    cycles: list = field(default_factory=list)
+    elapsed: float = 0.0
+    reverse: bool = False
+
+    @property
+    def node_count(self):
+        return len(self.edges)
+
+    @property
+    def edge_count(self):
+        return sum(len(deps) for deps in self.edges.values())
+
+    def summary(self):
+        if self.reverse:
+            return (f"{self.root}: needed by {self.node_count - 1} packages, "
+                    f"{self.edge_count} edges, {len(self.cycles)} cycles, "
+                    f"resolved in {self.elapsed * 1000:.1f} ms")
+        return (f"{self.root}: {self.node_count} packages, {self.edge_count} edges, "
+                f"{len(self.cycles)} cycles, {len(self.missing)} missing, "
+                f"resolved in {self.elapsed * 1000:.1f} ms")
+
+
+class Resolver:
+    """Resolves dependency closures, memoizing work shared between roots.
+
+    Each package's ``D:`` line is resolved through the index once per
+    resolver; finished closures are kept so repeated roots are free.
+    The walk runs on the integer ids of the index's
+    :class:`~depviz.names.NameTable`; names are only looked up again when
+    the finished :class:`DependencyGraph` is built.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.names = index.names
+        self._direct = {}
+        self._labels = {}
+        self._missing = set()
+        self._closures = {}
+        self._dependents = None
+        self._dependent_labels = {}
+        self._reverse_closures = {}
+
+    def direct_ids(self, node):
+        """Return the resolved dependency ids of package id *node*."""
+        deps = self._direct.get(node)
+        if deps is None:
+            deps = []
+            defines = self.index.defines
+            for dep in self.index.dependency_ids(node):
+                # A package providing its own dependency is not an edge.
+                if dep != node and dep not in deps:
+                    deps.append(dep)
+                    if not defines(dep):
+                        self._missing.add(dep)
+            self._direct[node] = deps
+            # Name lists are memoized alongside the id lists, so closures
+            # sharing a subgraph share its lists too.
+            strings = self.names.strings
+            self._labels[node] = [strings[dep] for dep in deps]
+        return deps
+
+    def dependent_ids(self, node):
+        """Return the ids of the packages depending directly on package id *node*.
+
+        The reverse adjacency of the whole index is built on first use, in
+        one pass over the resolved ``D:`` lines, and kept for later queries.
+        """
+        if self._dependents is None:
+            dependents = {}
+            dependency_ids = self.index.dependency_ids
+            for pkg in self.index.package_ids():
+                for dep in dependency_ids(pkg):
+                    if dep == pkg:
+                        continue
+                    # pkg's edges are appended back to back, so a repeated
+                    # token can only duplicate the last entry.
+                    sources = dependents.get(dep)
+                    if sources is None:
+                        dependents[dep] = [pkg]
+                    elif sources[-1] != pkg:
+                        sources.append(pkg)
+            self._dependents = dependents
+        return self._dependents.get(node, [])
+
+    def _dependent_names(self, node):
+        labels = self._dependent_labels.get(node)
+        if labels is None:
+            strings = self.names.strings
+            labels = self._dependent_labels[node] = [
+                strings[pkg] for pkg in self.dependent_ids(node)]
+        return labels
+
+    def invalidate(self, nodes):
+        """Forget what was derived from the ``D:`` lines of package ids *nodes*.
+
+        Called after the index was updated in place (see
+        :meth:`~depviz.provides.ProvidesIndex.apply`).  Only closures
+        reaching one of *nodes* are dropped; the reverse adjacency is
+        rebuilt on its next use.  Return the roots whose graphs were dropped.
+        """
+        if not nodes:
+            return []
+        for node in nodes:
+            self._direct.pop(node, None)
+            self._labels.pop(node, None)
+        defines = self.index.defines
+        self._missing = {node for node in self._missing if not defines(node)}
+        strings = self.names.strings
+        names = {strings[node] for node in nodes}
+        dropped = [root for root, graph in self._closures.items()
+                   if not names.isdisjoint(graph.edges)]
+        for root in dropped:
+            del self._closures[root]
+        dropped.extend(self._reverse_closures)
+        self._dependents = None
+        self._dependent_labels = {}
+        self._reverse_closures = {}
+        return dropped
+
+    def _walk(self, start, successors):
+        """Depth-first walk over ids from *start*; return ``(edges, back_edges)``.
+
+        The walk uses an explicit stack, so arbitrarily deep chains cannot
+        overflow the interpreter stack; an edge into a node still on the
+        stack is a back edge, i.e. closes a cycle.
+        """
+        edges = {start: successors(start)}
+        cycles = []
+        on_stack = {start}
+        stack = [(start, iter(edges[start]))]
+        while stack:
+            node, pending = stack[-1]
+            for dep in pending:
+                if dep in on_stack:
+                    cycles.append((node, dep))
+                elif dep not in edges:
+                    edges[dep] = successors(dep)
+                    on_stack.add(dep)
+                    stack.append((dep, iter(edges[dep])))
+                    break
+            else:
+                stack.pop()
+                on_stack.discard(node)
+        return edges, cycles
+
+    def _query(self, root, memo, successors, labels, reverse):
+        graph = memo.get(root)
+        if graph is not None:
+            return graph
+        started = time.perf_counter()
+        start = self.names.lookup(root)
+        if start is None:
+            graph = DependencyGraph(root, {root: []}, reverse=reverse)
+        else:
+            edges, cycles = self._walk(start, successors)
+            strings = self.names.strings
+            graph = DependencyGraph(
+                root,
+                {strings[node]: labels(node) for node in edges},
+                missing={strings[node] for node in self._missing.intersection(edges)},
+                cycles=[(strings[u], strings[v]) for u, v in cycles],
+                reverse=reverse,
+            )
+        graph.elapsed = time.perf_counter() - started
+        memo[root] = graph
+        return graph
+
+    def closure(self, root):
+        """Return the :class:`DependencyGraph` of everything *root* needs.
+
+        An edge into a package still on the walk's stack is reported as a
+        cycle.
+        """
+        return self._query(root, self._closures, self.direct_ids,
+                           self._labels.__getitem__, False)
+
+    def reverse_closure(self, root):
+        """Return the :class:`DependencyGraph` of everything that needs *root*.
+
+        Edges point from a package to its dependents, so the graph reads
+        "what breaks if *root* changes".
+        """
+        return self._query(root, self._reverse_closures, self.dependent_ids,
+                           self._dependent_names, True)
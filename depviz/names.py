@@ -0,0 +1,57 @@
+"""Interned string table shared by the package indexes.
+
+An APKINDEX repeats the same few thousand strings (``so:libc.musl...``,
+``cmd:sh``, package names) across tens of thousands of ``D:`` and ``p:``
+lines.  :class:`NameTable` keeps one copy of each and hands out small
+integer ids, so indexes and the resolver can store dependency lists as
+integer arrays and compare ids instead of strings.
+"""
+
+from array import array
+
+
+class NameTable:
+    """Bidirectional mapping between strings and dense ids ``0..n-1``.
+
+    :attr:`strings` is the plain list behind ``table[id]``; hot loops index
+    it directly to skip a method call per lookup.
+    """
+
+    __slots__ = ("_ids", "strings")
+
+    def __init__(self, strings=()):
+        # *strings* must be distinct; they get the ids 0, 1, 2, ...
+        self.strings = list(strings)
+        self._ids = dict(zip(self.strings, range(len(self.strings))))
+
+    def intern(self, name):
+        """Return the id of *name*, allocating the next id on first sight."""
+        node = self._ids.get(name)
+        if node is None:
+            node = self._ids[name] = len(self.strings)
+            self.strings.append(name)
+        return node
+
+    def intern_all(self, names):
+        """Intern every one of the distinct strings *names*; return their ids as an array."""
+        ids = self._ids
+        new = [name for name in names if name not in ids]
+        ids.update(zip(new, range(len(self.strings), len(self.strings) + len(new))))
+        self.strings.extend(new)
+        return array("I", map(ids.__getitem__, names))
+
+    def lookup(self, name):
+        """Return the id of *name*, or ``None`` if it was never interned."""
+        return self._ids.get(name)
+
+    def __getitem__(self, node):
+        return self.strings[node]
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __iter__(self):
+        return iter(self.strings)
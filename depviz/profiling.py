@@ -0,0 +1,269 @@
+"""Per-stage instrumentation of the CLI pipeline.
+
+The pipeline code reports to the *active* profiler returned by :func:`get`.
+By default that is a :class:`NullProfiler` whose methods do nothing, so
+instrumentation costs a method call when profiling is off.
+
+Stage times are exclusive: while a nested stage runs (decompression pulled
+by the stanza parser, say) its parent's clock is paused.  With several
+repositories fetched concurrently, times are summed over threads.
+"""
+
+import cProfile
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+TRACEMALLOC_TOP = 10
+STAGES = ("config", "fetch", "decompress", "parse", "index", "resolve", "render")
+
+
+def peak_rss_kib():
+    """Peak resident set size of this process so far, in KiB (0 if unknown)."""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class _Stage:
+    __slots__ = ("wall", "calls", "peak_rss", "counters")
+
+    def __init__(self):
+        self.wall = 0.0
+        self.calls = 0
+        self.peak_rss = 0
+        self.counters = {}
+
+    def as_dict(self):
+        return {"wall": self.wall, "calls": self.calls, "peak_rss_kib": self.peak_rss,
+                **self.counters}
+
+
+class _CountingReader:
+    def __init__(self, fileobj, profiler, stage):
+        self._fileobj = fileobj
+        self._profiler = profiler
+        self._stage = stage
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self._profiler.count(self._stage, "bytes", len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._fileobj.close()
+
+
+class Profiler:
+    def __init__(self):
+        self.stages = {name: _Stage() for name in STAGES}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _get(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = _Stage()
+        return stage
+
+    def _enter(self, name):
+        now = time.perf_counter()
+        stack = self._stack()
+        if stack:
+            parent = stack[-1]
+            self._add_time(parent[0], now - parent[1])
+        stack.append([name, now])
+
+    def _exit(self, calls=0):
+        now = time.perf_counter()
+        stack = self._stack()
+        name, started = stack.pop()
+        self._add_time(name, now - started, calls)
+        if stack:
+            stack[-1][1] = now
+        return name
+
+    def _add_time(self, name, seconds, calls=0):
+        with self._lock:
+            stage = self._get(name)
+            stage.wall += seconds
+            stage.calls += calls
+
+    def _record_rss(self, name):
+        rss = peak_rss_kib()
+        with self._lock:
+            stage = self._get(name)
+            stage.peak_rss = max(stage.peak_rss, rss)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as stage *name*."""
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit(calls=1)
+            self._record_rss(name)
+
+    def record(self, name, seconds):
+        """Account an externally measured duration to stage *name*."""
+        self._add_time(name, seconds, calls=1)
+        self._record_rss(name)
+
+    def count(self, name, counter, amount=1):
+        with self._lock:
+            counters = self._get(name).counters
+            counters[counter] = counters.get(counter, 0) + amount
+
+    def iter(self, name, iterable, counter="items", measure=None):
+        """Yield from *iterable*, timing each step as stage *name*.
+
+        Every item adds ``measure(item)`` (or 1) to *counter*.
+        """
+        iterator = iter(iterable)
+        total = 0
+        try:
+            while True:
+                self._enter(name)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self._exit()
+                total += measure(item) if measure is not None else 1
+                yield item
+        finally:
+            self.count(name, counter, total)
+            self._add_time(name, 0.0, calls=1)
+            self._record_rss(name)
+
+    def reader(self, name, fileobj):
+        """Wrap *fileobj* so the bytes read from it are counted under *name*."""
+        return _CountingReader(fileobj, self, name)
+
+    def report(self):
+        """Return the collected stages (skipping those never entered) as a dict."""
+        return {name: stage.as_dict() for name, stage in self.stages.items() if stage.calls}
+
+    def format_table(self):
+        rows = self.report()
+        total = sum(row["wall"] for row in rows.values())
+        lines = [f"{'stage':<12} {'wall ms':>10} {'share':>6} {'peak RSS MiB':>13}  counters"]
+        for name, row in rows.items():
+            counters = ", ".join(f"{key}={value}" for key, value in row.items()
+                                 if key not in ("wall", "calls", "peak_rss_kib"))
+            share = row["wall"] / total * 100 if total else 0.0
+            lines.append(f"{name:<12} {row['wall'] * 1000:>10.2f} {share:>5.1f}% "
+                         f"{row['peak_rss_kib'] / 1024:>13.1f}  {counters}")
+        lines.append(f"{'total':<12} {total * 1000:>10.2f}")
+        return "\n".join(lines)
+
+
+class NullProfiler:
+    """Profiler stand-in used when profiling is disabled."""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def count(self, name, counter, amount=1):
+        pass
+
+    def iter(self, name, iterable, counter="items", measure=None):
+        return iterable
+
+    def reader(self, name, fileobj):
+        return fileobj
+
+
+_active = NullProfiler()
+
+
+def get():
+    """Return the active profiler."""
+    return _active
+
+
+def activate(profiler):
+    """Make *profiler* the active profiler; return the previous one."""
+    global _active
+    previous, _active = _active, profiler
+    return previous
+
+
+@contextmanager
+def session(options, elapsed=None, out=None):
+    """Profile the enclosed block as set up by *options* (``ProfileOptions``).
+
+    *elapsed* maps stages timed before the session started (configuration
+    loading, which decides whether profiling is on) to their durations.
+    On exit the stage table is written to *out* (stderr by default), and
+    the JSON report, cProfile stats and tracemalloc summary are produced as
+    configured.
+    """
+    if out is None:
+        out = sys.stderr
+    profiler = Profiler() if options.enabled else None
+    previous = activate(profiler) if profiler is not None else None
+    for name, seconds in (elapsed or {}).items():
+        if profiler is not None:
+            profiler.record(name, seconds)
+    captured = None
+    if options.tracemalloc:
+        tracemalloc.start()
+    if options.cprofile:
+        captured = cProfile.Profile()
+        captured.enable()
+    try:
+        yield profiler
+    finally:
+        if captured is not None:
+            captured.disable()
+            captured.dump_stats(options.cprofile)
+        traced = None
+        if options.tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top = snapshot.statistics("lineno")[:TRACEMALLOC_TOP]
+            traced = {
+                "current": current,
+                "peak": peak,
+                "top": [{"where": str(stat.traceback[0]), "size": stat.size, "count": stat.count}
+                        for stat in top],
+            }
+            print(f"tracemalloc: peak {peak / 2**20:.1f} MiB, current {current / 2**20:.1f} MiB",
+                  file=out)
+            for entry in traced["top"]:
+                print(f"  {entry['size'] / 1024:>10.1f} KiB  {entry['count']:>8}  {entry['where']}",
+                      file=out)
+        if profiler is not None:
+            activate(previous)
+            print(profiler.format_table(), file=out)
+            if options.json:
+                report = {"stages": profiler.report(), "peak_rss_kib": peak_rss_kib()}
+                if traced is not None:
+                    report["tracemalloc"] = traced
+                with open(options.json, "w", encoding="utf-8") as f:
+                    json.dump(report, f, indent=2)
@@ -0,0 +1,505 @@
+"""Reverse index from provided names to the packages that provide them.
+
+Alpine ``D:`` fields mostly reference virtual names (``so:libc.musl-x86_64.so.1``,
+``cmd:sh``, ``pc:zlib``) that only appear in other packages' ``p:`` lines.
+:class:`ProvidesIndex` is built in one pass over the package table so every
+dependency token resolves with a single dictionary lookup.
+"""
+
+import re
+import time
+from array import array
+from dataclasses import dataclass, field
+
+from .apkindex import Package, iter_mapped_spans, parse_stanza, split_stanzas
+from .names import NameTable
+from .version import parse_version, satisfies
+
+DEPENDENCY_RE = re.compile(r"^(?P<name>[^<>=~]+)(?:(?P<op>[<>=~]+)(?P<version>.*))?$")
+
+_UNSEEN = object()
+_CONFLICT = object()
+
+
+def split_dependency(token):
+    """Split a ``D:`` token into ``(name, operator, version)``.
+
+    Conflicts (``!name``) yield ``None`` as they are not dependencies.
+    """
+    if token.startswith("!"):
+        return None
+    match = DEPENDENCY_RE.match(token)
+    if match is None:
+        return token, "", ""
+    return match["name"], match["op"] or "", match["version"] or ""
+
+
+def _fingerprint(pkg):
+    # Test repositories carry no C: checksum; the fields the graph is
+    # built from stand in for it.
+    return pkg.checksum or (pkg.version, tuple(pkg.depends), tuple(pkg.provides))
+
+
+@dataclass
+class IndexChanges:
+    """Difference between a loaded :class:`ProvidesIndex` and a new package stream.
+
+    ``added`` and ``changed`` hold the new records, ``removed`` the names
+    that disappeared.  :meth:`ProvidesIndex.apply` fills ``affected``, the
+    package ids whose resolved dependencies may differ; ``dropped`` lists
+    the roots whose memoized closures were discarded.  ``ranks`` keeps the
+    priority order of the new stream, which decides between providers.
+    """
+
+    added: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    affected: set = field(default_factory=set)
+    dropped: list = field(default_factory=list)
+    ranks: dict = field(default_factory=dict)  # name -> position in the new stream
+    elapsed: float = 0.0
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def summary(self):
+        return (f"{len(self.changed)} changed, {len(self.added)} added, "
+                f"{len(self.removed)} removed; {len(self.affected)} packages to re-resolve, "
+                f"{len(self.dropped)} closures dropped, updated in {self.elapsed * 1000:.1f} ms")
+
+
+@dataclass
+class IndexChunk:
+    """The records of a :class:`ProvidesIndex` flattened for pickling.
+
+    Built by :meth:`ProvidesIndex.chunk` in a worker process and consumed
+    by :meth:`ProvidesIndex.merge`.  Record ``r`` owns ``package[r]`` and
+    the ``[start, end)`` slices of ``depends`` and ``provides``; provider
+    entries are three parallel sequences instead of nested lists, so they
+    unpickle as flat arrays.  Ids refer to ``names``.
+    """
+
+    names: list
+    package: array
+    versions: list
+    checksums: list
+    depends: array
+    depends_start: array
+    depends_end: array
+    provides: array
+    provides_start: array
+    provides_end: array
+    provider_names: array
+    provider_records: array
+    provider_keys: list
+
+
+class ProvidesIndex:
+    """Name and provides lookup over a set of :class:`~depviz.apkindex.Package`.
+
+    Records are kept as parallel arrays indexed by record number rather than
+    as one object per package.  Every package name, ``D:`` token and ``p:``
+    entry is an id in :attr:`names`, so the dependency and provides lists
+    of all packages share two flat integer arrays; each record points at
+    its ``[start, end)`` slices, so a record can be rewritten in place by
+    :meth:`apply`.  A record's rank is its position in the package stream
+    and orders the providers of a name; it equals the record number until
+    :meth:`apply` inserts packages mid-stream.
+    """
+
+    def __init__(self, packages=()):
+        self.names = NameTable()
+        self._records = {}  # package name id -> record number, live records only
+        self._package = array("I")  # record -> package name id
+        self._rank = array("I")  # record -> priority among providers
+        self._next_rank = 0
+        self._ranked = False  # whether ranks differ from record order
+        self._live = bytearray()
+        self._versions = []
+        self._checksums = []
+        self._depends = array("I")
+        self._depends_start = array("I")
+        self._depends_end = array("I")
+        self._provides = array("I")
+        self._provides_start = array("I")
+        self._provides_end = array("I")
+        self._providers = {}  # provided name id -> [(version key, record)], by rank
+        self._resolved = {}  # D: token id -> record, None or CONFLICT
+        self._token_names = {}  # D: token id -> name id it depends on, or None
+        for pkg in packages:
+            self.add(pkg)
+
+    def add(self, pkg):
+        node = self.names.intern(pkg.name)
+        # The first record of a name wins, as in apk's own repository order.
+        if node in self._records:
+            return
+        self._resolved.clear()
+        self._write(self._allocate(node), pkg)
+
+    def _allocate(self, node):
+        record = self._records[node] = len(self._package)
+        self._package.append(node)
+        self._rank.append(self._next_rank)
+        self._next_rank += 1
+        self._live.append(1)
+        self._versions.append("")
+        self._checksums.append(None)
+        for spans in (self._depends_start, self._depends_end,
+                      self._provides_start, self._provides_end):
+            spans.append(0)
+        return record
+
+    def _write(self, record, pkg):
+        intern = self.names.intern
+        self._versions[record] = pkg.version
+        self._checksums[record] = _fingerprint(pkg)
+        self._depends_start[record] = len(self._depends)
+        self._depends.extend(map(intern, pkg.depends))
+        self._depends_end[record] = len(self._depends)
+        self._provides_start[record] = len(self._provides)
+        self._provides.extend(map(intern, pkg.provides))
+        self._provides_end[record] = len(self._provides)
+        # Versions are tokenized once here; resolving a constraint later is
+        # a tuple comparison.
+        self._register(self._package[record], parse_version(pkg.version), record)
+        for entry in pkg.provides:
+            name, sep, version = entry.partition("=")
+            # An unversioned provide cannot satisfy a versioned dependency.
+            key = parse_version(version) if sep else None
+            self._register(intern(name), key, record)
+
+    def _register(self, node, key, record):
+        providers = self._providers.get(node)
+        if providers is None:
+            self._providers[node] = [(key, record)]
+            return
+        # Lists stay in rank order, which is the tie-break between
+        # providers; only a record written by apply() can land mid-list.
+        rank = self._rank
+        i = len(providers)
+        while i and rank[providers[i - 1][1]] > rank[record]:
+            i -= 1
+        providers.insert(i, (key, record))
+
+    def _provided_names(self, record):
+        strings = self.names.strings
+        names = {self._package[record]}
+        for entry in self._provides[self._provides_start[record]:self._provides_end[record]]:
+            names.add(self.names.intern(strings[entry].partition("=")[0]))
+        return names
+
+    def _unregister(self, record):
+        names = self._provided_names(record)
+        for node in names:
+            providers = [entry for entry in self._providers[node] if entry[1] != record]
+            if providers:
+                self._providers[node] = providers
+            else:
+                del self._providers[node]
+        return names
+
+    def _token_name(self, token):
+        node = self._token_names.get(token, _UNSEEN)
+        if node is _UNSEEN:
+            parts = split_dependency(self.names.strings[token])
+            node = self._token_names[token] = (None if parts is None
+                                               else self.names.intern(parts[0]))
+        return node
+
+    def diff(self, packages):
+        """Compare the index with *packages*, a complete new package stream.
+
+        *packages* come in priority order, as for :meth:`add`.  Records are
+        compared by their ``C:`` checksum, so an unchanged stanza is never
+        decoded beyond its ``P:`` and ``C:`` lines.
+        """
+        started = time.perf_counter()
+        latest = {}
+        for pkg in packages:
+            latest.setdefault(pkg.name, pkg)
+        changes = IndexChanges(ranks=dict(zip(latest, range(len(latest)))))
+        lookup = self.names.lookup
+        for name, pkg in latest.items():
+            record = self._records.get(lookup(name))
+            if record is None:
+                changes.added.append(pkg)
+            elif self._checksums[record] != _fingerprint(pkg):
+                changes.changed.append(pkg)
+        strings = self.names.strings
+        changes.removed = [strings[node] for node in self._records if strings[node] not in latest]
+        changes.elapsed = time.perf_counter() - started
+        return changes
+
+    def apply(self, changes):
+        """Update the index in place with :class:`IndexChanges` from :meth:`diff`.
+
+        Every record takes its position in the new stream as its rank, so
+        providers keep the order a fresh load would give them.  Only cached
+        resolutions of tokens that name a touched package or provide are
+        forgotten, unless existing packages swapped places, which may
+        change any tie-break and so resets all of them.
+        """
+        started = time.perf_counter()
+        touched = set()
+        for name in changes.removed:
+            node = self.names.lookup(name)
+            record = self._records.pop(node)
+            self._live[record] = 0
+            touched |= self._unregister(record)
+            changes.affected.add(node)
+        reordered = self._rerank(changes.ranks)
+        for pkg in changes.changed:
+            node = self.names.lookup(pkg.name)
+            record = self._records[node]
+            touched |= self._unregister(record)
+            self._write(record, pkg)
+            touched |= self._provided_names(record)
+            changes.affected.add(node)
+        for pkg in changes.added:
+            node = self.names.intern(pkg.name)
+            record = self._allocate(node)
+            self._rank[record] = changes.ranks[pkg.name]
+            self._write(record, pkg)
+            touched |= self._provided_names(record)
+            changes.affected.add(node)
+        self._next_rank = len(changes.ranks)
+        self._ranked = True
+        if reordered:
+            rank = self._rank
+            for providers in self._providers.values():
+                providers.sort(key=lambda entry: rank[entry[1]])
+            self._resolved.clear()
+            changes.affected.update(self._records)
+        stale = {token for token in self._resolved if self._token_name(token) in touched}
+        for token in stale:
+            del self._resolved[token]
+        if stale:
+            for node, record in self._records.items():
+                depends = self._depends[self._depends_start[record]:self._depends_end[record]]
+                if not stale.isdisjoint(depends):
+                    changes.affected.add(node)
+        changes.elapsed += time.perf_counter() - started
+        return changes
+
+    def _rerank(self, ranks):
+        """Give every live record its position in *ranks*; return whether their order changed."""
+        strings = self.names.strings
+        rank = self._rank
+        before = sorted(self._records.values(), key=rank.__getitem__)
+        for record in before:
+            rank[record] = ranks[strings[self._package[record]]]
+        return any(rank[a] > rank[b] for a, b in zip(before, before[1:]))
+
+    def _ordered_records(self):
+        """Return the live record numbers in rank order."""
+        records = [record for record, live in enumerate(self._live) if live]
+        if self._ranked:
+            records.sort(key=self._rank.__getitem__)
+        return records
+
+    def chunk(self):
+        """Return the live records as an :class:`IndexChunk` for :meth:`merge`."""
+        records = self._ordered_records()
+        position = dict(zip(records, range(len(records))))
+        nodes, positions, keys = array("I"), array("I"), []
+        for node, providers in self._providers.items():
+            for key, record in providers:
+                nodes.append(node)
+                positions.append(position[record])
+                keys.append(key)
+        return IndexChunk(
+            self.names.strings,
+            array("I", (self._package[record] for record in records)),
+            [self._versions[record] for record in records],
+            [self._checksums[record] for record in records],
+            self._depends,
+            array("I", (self._depends_start[record] for record in records)),
+            array("I", (self._depends_end[record] for record in records)),
+            self._provides,
+            array("I", (self._provides_start[record] for record in records)),
+            array("I", (self._provides_end[record] for record in records)),
+            nodes,
+            positions,
+            keys,
+        )
+
+    def merge(self, chunk):
+        """Add the records of :class:`IndexChunk` *chunk* after this index's own.
+
+        The outcome is the same as passing the chunk's packages to
+        :meth:`add` in order: its ids are remapped into :attr:`names`, a
+        package this index already holds keeps its record, and providers
+        rank after the existing ones.  Arrays are remapped in bulk.
+        """
+        remap = self.names.intern_all(chunk.names)
+        nodes = array("I", map(remap.__getitem__, chunk.package))
+        first = len(self._package)
+        if self._records.keys().isdisjoint(nodes):
+            count = len(nodes)
+            renumber = range(first, first + count)
+
+            def pick(values):
+                return values
+        else:
+            records = [record for record, node in enumerate(nodes) if node not in self._records]
+            count = len(records)
+            renumber = [None] * len(nodes)
+            for i, record in enumerate(records):
+                renumber[record] = first + i
+
+            def pick(values):
+                return [values[record] for record in records]
+
+            nodes = pick(nodes)
+        if not count:
+            return
+        self._resolved.clear()
+        self._package.extend(nodes)
+        self._rank.extend(range(self._next_rank, self._next_rank + count))
+        self._next_rank += count
+        self._records.update(zip(nodes, range(first, first + count)))
+        self._live.extend(bytes([1]) * count)
+        self._versions.extend(pick(chunk.versions))
+        self._checksums.extend(pick(chunk.checksums))
+        base = len(self._depends)
+        self._depends_start.extend(map(base.__add__, pick(chunk.depends_start)))
+        self._depends_end.extend(map(base.__add__, pick(chunk.depends_end)))
+        base = len(self._provides)
+        self._provides_start.extend(map(base.__add__, pick(chunk.provides_start)))
+        self._provides_end.extend(map(base.__add__, pick(chunk.provides_end)))
+        self._depends.extend(map(remap.__getitem__, chunk.depends))
+        self._provides.extend(map(remap.__getitem__, chunk.provides))
+        # Every merged record comes after all existing ones, so appending
+        # keeps the provider lists in record order.
+        providers = self._providers
+        for node, record, key in zip(map(remap.__getitem__, chunk.provider_names),
+                                     chunk.provider_records, chunk.provider_keys):
+            record = renumber[record]
+            if record is None:
+                continue
+            entries = providers.get(node)
+            if entries is None:
+                providers[node] = [(key, record)]
+            else:
+                entries.append((key, record))
+
+    def _record(self, record):
+        names = self.names
+        depends = self._depends[self._depends_start[record]:self._depends_end[record]]
+        provides = self._provides[self._provides_start[record]:self._provides_end[record]]
+        return Package(names[self._package[record]], self._versions[record],
+                       [names[token] for token in depends],
+                       [names[entry] for entry in provides])
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, name):
+        return self.names.lookup(name) in self._records
+
+    def __iter__(self):
+        return map(self._record, self._ordered_records())
+
+    def package(self, name):
+        """Return the real package called *name*, or ``None``."""
+        record = self._records.get(self.names.lookup(name))
+        return None if record is None else self._record(record)
+
+    def providers(self, name):
+        """Return ``(version_key, package)`` pairs for *name*.
+
+        ``version_key`` comes from :func:`~depviz.version.parse_version`, or
+        is ``None`` for an unversioned provide.
+        """
+        providers = self._providers.get(self.names.lookup(name), ())
+        return [(key, self._record(record)) for key, record in providers]
+
+    def _resolve(self, token):
+        parts = split_dependency(token)
+        if parts is None:
+            return None
+        name, op, version = parts
+        node = self.names.lookup(name)
+        record = self._records.get(node)
+        if not op:
+            if record is not None:
+                return record
+            providers = self._providers.get(node)
+            return providers[0][1] if providers else None
+
+        bound = parse_version(version)
+        best = None
+        for key, provider in self._providers.get(node, ()):
+            if key is None or not satisfies(key, op, bound):
+                continue
+            if provider == record:
+                return record
+            if best is None or key > best[0]:
+                best = key, provider
+        return best[1] if best is not None else None
+
+    def resolve(self, token):
+        """Return the package satisfying dependency *token*, or ``None``.
+
+        A real package of that name is preferred over virtual providers.
+        With a version constraint, only providers whose version satisfies it
+        qualify, and among virtual providers the highest version wins.
+        """
+        record = self._resolve(token)
+        return None if record is None else self._record(record)
+
+    def package_ids(self):
+        """Return the name ids of all real packages, in priority order."""
+        if self._ranked:
+            return [self._package[record] for record in self._ordered_records()]
+        return [node for node, live in zip(self._package, self._live) if live]
+
+    def defines(self, node):
+        """Return whether name id *node* is a real package."""
+        return node in self._records
+
+    def dependency_ids(self, node):
+        """Return the name ids satisfying the ``D:`` tokens of package id *node*.
+
+        A token nothing satisfies stands for itself, so it shows up as a
+        node that :meth:`defines` rejects; conflicts are skipped.
+        """
+        record = self._records.get(node)
+        if record is None:
+            return []
+        strings = self.names.strings
+        resolved = self._resolved
+        deps = []
+        for token in self._depends[self._depends_start[record]:self._depends_end[record]]:
+            # The same few tokens (so:libc..., cmd:sh) recur in most packages.
+            provider = resolved.get(token, _UNSEEN)
+            if provider is _UNSEEN:
+                text = strings[token]
+                provider = resolved[token] = (_CONFLICT if text.startswith("!")
+                                              else self._resolve(text))
+            if provider is None:
+                deps.append(token)
+            elif provider is not _CONFLICT:
+                deps.append(self._package[provider])
+        return deps
+
+
+def index_text(data):
+    """Index uncompressed APKINDEX text *data*; return it as an :class:`IndexChunk`.
+
+    This is the unit of work of :func:`index_parallel`.
+    """
+    spans = iter_mapped_spans(data)
+    return ProvidesIndex(parse_stanza(data, start, end) for start, end in spans).chunk()
+
+
+def index_parallel(data, pool, parts):
+    """Index APKINDEX text *data* as *parts* stanza-aligned chunks on *pool*.
+
+    *pool* is a :class:`concurrent.futures.ProcessPoolExecutor`.  Returns
+    the :class:`IndexChunk` of every chunk in text order, ready for
+    :meth:`ProvidesIndex.merge`.
+    """
+    chunks = [data[start:end] for start, end in split_stanzas(data, parts)]
+    return list(pool.map(index_text, chunks))
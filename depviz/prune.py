@@ -0,0 +1,133 @@
+"""Size-bounding transformations applied to a closure before it is drawn.
+
+Full closures of packages such as ``gcc`` or ``python3`` produce images
+nobody can read and layouts that take super-linear time.  Each function
+here returns a new, smaller :class:`~depviz.graph.DependencyGraph` and
+leaves its input untouched, so the ASCII output can still show the whole
+closure.
+"""
+
+from collections import deque
+
+from .graph import DependencyGraph
+
+COMMON_BASE = "common base ({} packages)"
+
+
+def _derived(graph, edges):
+    return DependencyGraph(
+        graph.root,
+        edges,
+        missing={name for name in graph.missing if name in edges},
+        cycles=[(u, v) for u, v in graph.cycles if u in edges and v in edges.get(u, ())],
+        elapsed=graph.elapsed,
+        reverse=graph.reverse,
+    )
+
+
+def limit_depth(graph, max_depth):
+    """Keep only packages at most *max_depth* edges away from the root."""
+    depth = {graph.root: 0}
+    queue = deque([graph.root])
+    while queue:
+        name = queue.popleft()
+        if depth[name] == max_depth:
+            continue
+        for dep in graph.edges[name]:
+            if dep not in depth:
+                depth[dep] = depth[name] + 1
+                queue.append(dep)
+    edges = {name: [dep for dep in graph.edges[name] if dep in depth] if depth[name] < max_depth
+             else [] for name in depth}
+    return _derived(graph, edges)
+
+
+def collapse_common(graph, min_in_degree):
+    """Merge packages with at least *min_in_degree* dependents into one node.
+
+    Widely shared bases (``musl``, ``busybox``, ``so:libc...`` providers)
+    draw an edge from nearly every package; folding them into a single
+    "common base" node removes most of those edges from the layout.
+    """
+    in_degree = dict.fromkeys(graph.edges, 0)
+    for deps in graph.edges.values():
+        for dep in deps:
+            in_degree[dep] += 1
+    common = {name for name, degree in in_degree.items()
+              if degree >= min_in_degree and name != graph.root}
+    if len(common) < 2:
+        return graph
+    cluster = COMMON_BASE.format(len(common))
+    edges = {}
+    base_deps = []
+    for name, deps in graph.edges.items():
+        targets = []
+        for dep in deps:
+            dep = cluster if dep in common else dep
+            if dep not in targets:
+                targets.append(dep)
+        if name in common:
+            for dep in targets:
+                if dep != cluster and dep not in base_deps:
+                    base_deps.append(dep)
+        else:
+            edges[name] = targets
+    edges[cluster] = base_deps
+    return _derived(graph, edges)
+
+
+def _topological_order(nodes, succ):
+    """Kahn's algorithm over integer adjacency lists; sources first."""
+    indegree = [0] * nodes
+    for targets in succ:
+        for v in targets:
+            indegree[v] += 1
+    order = [u for u in range(nodes) if indegree[u] == 0]
+    for u in order:
+        for v in succ[u]:
+            indegree[v] -= 1
+            if indegree[v] == 0:
+                order.append(v)
+    return order
+
+
+def transitive_reduction(graph):
+    """Drop every edge ``A -> C`` that is implied by a longer path ``A -> ... -> C``.
+
+    Reachability sets are Python integers used as bitsets, filled in
+    reverse topological order, so each node costs one big-integer OR per
+    outgoing edge.  A child of ``A`` is redundant exactly when it is
+    reachable from another child of ``A``.  Edges closing a cycle (the
+    graph's recorded back edges) are ignored for reachability and kept.
+    """
+    names = list(graph.edges)
+    ids = {name: i for i, name in enumerate(names)}
+    back = set(graph.cycles)
+    succ = [[ids[dep] for dep in graph.edges[name] if (name, dep) not in back]
+            for name in names]
+    reach = [0] * len(names)  # strict descendants of each node
+    for u in reversed(_topological_order(len(names), succ)):
+        bits = 0
+        for v in succ[u]:
+            bits |= reach[v] | (1 << v)
+        reach[u] = bits
+    edges = {}
+    for u, name in enumerate(names):
+        covered = 0
+        for v in succ[u]:
+            covered |= reach[v]
+        # A repeated edge is implied by its first copy.
+        edges[name] = [dep for dep in dict.fromkeys(graph.edges[name])
+                       if (name, dep) in back or not covered >> ids[dep] & 1]
+    return _derived(graph, edges)
+
+
+def simplify(graph, max_depth=None, collapse_in_degree=None, reduce=False):
+    """Apply the configured transformations in a size-reducing order."""
+    if max_depth is not None:
+        graph = limit_depth(graph, max_depth)
+    if reduce:
+        graph = transitive_reduction(graph)
+    if collapse_in_degree is not None:
+        graph = collapse_common(graph, collapse_in_degree)
+    return graph
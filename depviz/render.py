@@ -0,0 +1,172 @@
+"""Image output of dependency graphs.
+
+Two layout engines are available: Graphviz (``dot`` in a subprocess, any
+output format) and the in-process layered layout of :mod:`depviz.layout`
+with the SVG writer of :mod:`depviz.svg`.  ``auto`` picks the native
+engine for SVG output and Graphviz otherwise.  Layout is CPU-bound,
+so when several images are requested (several roots, several formats)
+the jobs are spread over a process pool.  Graphs cross the process
+boundary in a compact packed form: the node names once, plus the edges as
+an integer array of ``(source, target)`` index pairs.
+"""
+
+import os
+import shutil
+import subprocess
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from .errors import RenderError
+from .svg import render_svg
+
+DOT_TIMEOUT = 600
+
+
+@dataclass
+class PackedGraph:
+    root: str
+    names: tuple
+    edges: bytes
+    missing: bytes = b""
+
+    @classmethod
+    def pack(cls, graph):
+        ids = {name: i for i, name in enumerate(graph.edges)}
+        names = tuple(graph.edges)
+        pairs = array("I")
+        for name, deps in graph.edges.items():
+            source = ids[name]
+            for dep in deps:
+                pairs.extend((source, ids[dep]))
+        missing = array("I", sorted(ids[name] for name in graph.missing if name in ids))
+        return cls(graph.root, names, pairs.tobytes(), missing.tobytes())
+
+    def iter_edge_ids(self):
+        pairs = array("I")
+        pairs.frombytes(self.edges)
+        for i in range(0, len(pairs), 2):
+            yield pairs[i], pairs[i + 1]
+
+    def iter_edges(self):
+        names = self.names
+        for u, v in self.iter_edge_ids():
+            yield names[u], names[v]
+
+    def missing_names(self):
+        ids = array("I")
+        ids.frombytes(self.missing)
+        return {self.names[i] for i in ids}
+
+
+@dataclass
+class RenderJob:
+    graph: PackedGraph
+    path: str
+    engine: str = "auto"
+
+
+@dataclass
+class RenderResult:
+    root: str
+    path: str
+    error: str = None
+
+
+def _quote(name):
+    return '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def to_dot(graph):
+    """Return the DOT source of a :class:`PackedGraph`."""
+    lines = [
+        "digraph dependencies {",
+        "  rankdir=TB;",
+        '  node [shape=box, fontname="Helvetica", fontsize=10];',
+        f"  {_quote(graph.root)} [style=bold];",
+    ]
+    for name in sorted(graph.missing_names()):
+        lines.append(f"  {_quote(name)} [style=dashed, color=red];")
+    for source, target in graph.iter_edges():
+        lines.append(f"  {_quote(source)} -> {_quote(target)};")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def image_format(path):
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    return "jpg" if ext == "jpeg" else ext
+
+
+def render_dot(graph, path):
+    """Lay out *graph* with Graphviz and write the image to *path*."""
+    dot = shutil.which("dot")
+    if dot is None:
+        raise RenderError("Graphviz 'dot' executable not found in PATH")
+    try:
+        subprocess.run([dot, f"-T{image_format(path)}", "-o", path],
+                       input=to_dot(graph).encode("utf-8"), capture_output=True,
+                       check=True, timeout=DOT_TIMEOUT)
+    except subprocess.CalledProcessError as e:
+        message = e.stderr.decode("utf-8", "replace").strip() or f"exit status {e.returncode}"
+        raise RenderError(f"dot failed for {path}: {message}") from None
+    except subprocess.TimeoutExpired:
+        raise RenderError(f"dot timed out after {DOT_TIMEOUT} s for {path}") from None
+    except OSError as e:
+        raise RenderError(f"cannot run dot: {e.strerror}") from None
+
+
+def render_image(graph, path, engine="auto"):
+    """Write the image of *graph* to *path* with the given layout engine."""
+    fmt = image_format(path)
+    if engine == "auto":
+        engine = "native" if fmt == "svg" else "graphviz"
+    if engine == "graphviz":
+        render_dot(graph, path)
+    elif fmt == "svg":
+        render_svg(graph, path)
+    else:
+        raise RenderError(f"the native layout engine writes SVG only, not {fmt}: {path}")
+
+
+def _run_job(job):
+    try:
+        render_image(job.graph, job.path, job.engine)
+    except RenderError as e:
+        return RenderResult(job.graph.root, job.path, str(e))
+    return RenderResult(job.graph.root, job.path)
+
+
+def render_many(jobs, workers=None):
+    """Render every :class:`RenderJob`; return one :class:`RenderResult` per job.
+
+    A single job runs in-process; several run in a process pool.  Failures
+    are reported per job instead of aborting the others.
+    """
+    jobs = list(jobs)
+    if len(jobs) <= 1 or workers == 1:
+        return [_run_job(job) for job in jobs]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_job, job) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:  # a crashed worker or unpicklable job
+                results.append(RenderResult(job.graph.root, job.path,
+                                            f"{type(e).__name__}: {e}"))
+    return results
+
+
+def image_paths(output_image, root, formats, batch):
+    """Return the image files to write for *root*.
+
+    In batch mode the root name is appended to the file stem so each root
+    gets its own files; every extra format swaps the extension.
+    """
+    stem, ext = os.path.splitext(output_image)
+    if batch:
+        stem = f"{stem}-{root}"
+    exts = [f".{fmt}" for fmt in formats] if formats else [ext]
+    return [stem + e for e in exts]
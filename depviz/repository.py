@@ -0,0 +1,69 @@
+"""Access to an Alpine repository, either over HTTP or on the local disk."""
+
+import os
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse
+
+from . import profiling
+from .errors import RepositoryError
+
+INDEX_ARCHIVE = "APKINDEX.tar.gz"
+USER_AGENT = "depviz/0.1"
+TIMEOUT = 30
+
+
+def is_remote(repository):
+    return urlparse(repository).scheme in ("http", "https")
+
+
+def index_url(repository):
+    """Return the location of ``APKINDEX.tar.gz`` for *repository*.
+
+    A local file is used as is, which also allows pointing at an already
+    extracted, uncompressed ``APKINDEX``.
+    """
+    if repository.endswith(".tar.gz"):
+        return repository
+    if is_remote(repository):
+        return repository.rstrip("/") + "/" + INDEX_ARCHIVE
+    if os.path.isfile(repository):
+        return repository
+    return os.path.join(repository, INDEX_ARCHIVE)
+
+
+def open_index(repository, cache=None):
+    """Open the index archive of *repository* as a binary file object.
+
+    With an :class:`~depviz.cache.IndexCache`, remote archives are fetched
+    with a conditional request and a ``304 Not Modified`` answer is served
+    from the cached copy.
+    """
+    location = index_url(repository)
+    if not is_remote(location):
+        try:
+            return open(location, "rb")
+        except OSError as e:
+            raise RepositoryError(f"cannot open {location}: {e.strerror}") from None
+    headers = {"User-Agent": USER_AGENT}
+    if cache is not None:
+        headers.update(cache.validators(location))
+    request = urllib.request.Request(location, headers=headers)
+    try:
+        response = urllib.request.urlopen(request, timeout=TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cache is not None:
+            profiling.get().count("fetch", "cache_hits")
+            return cache.open(location)
+        raise RepositoryError(f"{location}: HTTP {e.code} {e.reason}") from None
+    except (urllib.error.URLError, OSError) as e:
+        reason = getattr(e, "reason", e)
+        raise RepositoryError(f"cannot fetch {location}: {reason}") from None
+    if cache is None:
+        return response
+    try:
+        with response:
+            cache.store(location, response)
+    except OSError as e:
+        raise RepositoryError(f"cannot download {location} into cache: {e}") from None
+    return cache.open(location)
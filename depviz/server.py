@@ -0,0 +1,301 @@
+"""Long-running query server (``depviz --serve``).
+
+Every CLI run pays interpreter start-up, the cache check, decompression
+and parsing before answering a single question.  The server does that
+once: it keeps the loaded index, the resolver's memoized closures and the
+text it has already rendered, and answers over HTTP on a localhost port
+or a Unix socket::
+
+    GET /status                    JSON: package count, load time, last refresh
+    GET /deps/NAME                 direct D: dependencies, one per line
+    GET /tree/NAME[?reverse=1]     ASCII tree of the closure
+    GET /edges/NAME[?reverse=1]    "name: deps" lines of the closure
+    GET /image/NAME.svg[?reverse=1]  image (any configured image format)
+
+With ``serve.refresh_interval`` the repositories are re-read in a
+background thread and compared with the loaded index stanza by stanza
+(``C:`` checksums); only changed packages are re-indexed and only the
+closures and rendered answers reaching them are dropped.  A test
+repository has no checksums and is reloaded whole, the new index
+replacing the old one in a single assignment.
+"""
+
+import io
+import json
+import os
+import signal
+import stat
+import sys
+import tempfile
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .ascii_tree import write_tree
+from .collector import Collector
+from .config import IMAGE_EXTENSIONS
+from .errors import DepvizError, RenderError, RepositoryError
+from .prune import simplify, transitive_reduction
+from .render import PackedGraph, image_format, render_image
+
+CONTENT_TYPES = {
+    "svg": "image/svg+xml",
+    "png": "image/png",
+    "pdf": "application/pdf",
+    "jpg": "image/jpeg",
+}
+TEXT = "text/plain; charset=utf-8"
+
+
+class _State:
+    """One loaded index with everything derived from it.
+
+    An incremental refresh updates the index and the resolver's memos in
+    place, so every access to them holds :attr:`lock`.  Rendering works
+    on finished graphs and runs outside it; :attr:`generation` tells
+    whether a refresh happened meanwhile and the result is stale.
+    """
+
+    def __init__(self, config):
+        started = time.perf_counter()
+        self.collector = Collector(config)
+        self.load_seconds = time.perf_counter() - started
+        self.loaded_at = time.time()
+        self.rendered = {}
+        self.last_refresh = None
+        self.lock = threading.Lock()
+        self.generation = 0
+
+    def apply(self, changes):
+        with self.lock:
+            self.collector.apply(changes)
+            self.generation += 1
+            dropped = set(changes.dropped)
+            for key in [key for key in self.rendered if key[1] in dropped]:
+                del self.rendered[key]
+        self.last_refresh = {
+            "at": time.time(),
+            "changed": len(changes.changed),
+            "added": len(changes.added),
+            "removed": len(changes.removed),
+            "affected": len(changes.affected),
+            "dropped": len(changes.dropped),
+            "seconds": round(changes.elapsed, 6),
+        }
+
+    def graph(self, name, reverse):
+        """Return the graph of *name* and the generation it belongs to."""
+        with self.lock:
+            if reverse:
+                return self.collector.reverse_graph(name), self.generation
+            return self.collector.graph(name), self.generation
+
+    def direct_dependencies(self, name):
+        with self.lock:
+            return self.collector.direct_dependencies(name)
+
+    def store(self, key, value, generation):
+        """Cache *value* under *key* unless a refresh made it stale."""
+        with self.lock:
+            if generation == self.generation:
+                self.rendered[key] = value
+        return value
+
+
+class QueryServer:
+    """Answers dependency queries from an index kept in memory."""
+
+    def __init__(self, config):
+        self.config = config
+        self._state = _State(config)
+        self._stop = threading.Event()
+        self._refresher = None
+        self.refresh_errors = 0
+
+    def refresh(self):
+        """Bring the index up to date with the repositories."""
+        if self.config.test_mode:
+            self._state = _State(self.config)
+            return
+        state = self._state
+        # Fetching and diffing only read the index; queries go on meanwhile.
+        changes = state.collector.changes()
+        if changes:
+            state.apply(changes)
+            print(f"refresh: {changes.summary()}; a full load took "
+                  f"{state.load_seconds * 1000:.1f} ms", file=sys.stderr)
+
+    def _refresh_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except DepvizError as e:
+                # Keep serving the previous index until a reload succeeds.
+                self.refresh_errors += 1
+                print(f"refresh failed: {e}", file=sys.stderr)
+
+    def start_refresh(self):
+        interval = self.config.serve.refresh_interval
+        if interval and self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop, args=(interval,),
+                                               name="depviz-refresh", daemon=True)
+            self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        state = self._state
+        return {
+            "packages": len(state.collector.index),
+            "repositories": self.config.repositories,
+            "loaded_at": state.loaded_at,
+            "load_seconds": round(state.load_seconds, 6),
+            "refresh_interval": self.config.serve.refresh_interval,
+            "refresh_errors": self.refresh_errors,
+            "last_refresh": state.last_refresh,
+        }
+
+    def _text(self, state, kind, name, reverse):
+        key = (kind, name, reverse)
+        text = state.rendered.get(key)
+        if text is None:
+            graph, generation = state.graph(name, reverse)
+            if self.config.transitive_reduction:
+                graph = transitive_reduction(graph)
+            out = io.StringIO()
+            if kind == "tree":
+                write_tree(graph.edges, graph.root, out, collapse=self.config.collapse_repeated)
+            else:
+                for node, deps in graph.edges.items():
+                    out.write(f"{node}: {' '.join(deps)}\n")
+            text = state.store(key, out.getvalue(), generation)
+        return text
+
+    def _image(self, state, name, fmt, reverse):
+        key = ("image", name, reverse, fmt)
+        data = state.rendered.get(key)
+        if data is None:
+            config = self.config
+            graph, generation = state.graph(name, reverse)
+            graph = simplify(graph, config.max_depth,
+                             config.collapse_in_degree, config.transitive_reduction)
+            with tempfile.TemporaryDirectory(prefix="depviz-") as tmp:
+                path = os.path.join(tmp, f"graph.{fmt}")
+                render_image(PackedGraph.pack(graph), path, config.layout_engine)
+                with open(path, "rb") as f:
+                    data = state.store(key, f.read(), generation)
+        return data
+
+    def handle(self, target):
+        """Answer the GET request for *target*; return ``(status, type, body)``."""
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        reverse = query.get("reverse", ["0"])[-1] not in ("0", "", "false")
+        kind, _, name = url.path.lstrip("/").partition("/")
+        name = unquote(name)
+        # Take one reference, so a concurrent reload cannot switch the
+        # index in the middle of a request.
+        state = self._state
+        try:
+            if kind == "status" and not name:
+                return HTTPStatus.OK, "application/json", json.dumps(self.status()).encode()
+            if not name:
+                return HTTPStatus.NOT_FOUND, TEXT, b"unknown endpoint\n"
+            if kind == "deps":
+                deps = state.direct_dependencies(name)
+                return HTTPStatus.OK, TEXT, "".join(f"{dep}\n" for dep in deps).encode()
+            if kind in ("tree", "edges"):
+                return HTTPStatus.OK, TEXT, self._text(state, kind, name, reverse).encode()
+            if kind == "image":
+                root, ext = os.path.splitext(name)
+                if ext.lower() not in IMAGE_EXTENSIONS:
+                    return (HTTPStatus.BAD_REQUEST, TEXT,
+                            f"image name must end with one of {', '.join(IMAGE_EXTENSIONS)}\n"
+                            .encode())
+                fmt = image_format(name)
+                return HTTPStatus.OK, CONTENT_TYPES[fmt], self._image(state, root, fmt, reverse)
+        except RepositoryError as e:
+            return HTTPStatus.NOT_FOUND, TEXT, f"{e}\n".encode()
+        except RenderError as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, TEXT, f"{e}\n".encode()
+        return HTTPStatus.NOT_FOUND, TEXT, b"unknown endpoint\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "depviz/0.1"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status, content_type, body = self.server.queries.handle(self.path)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no address.
+        return self.client_address[0] if self.client_address else "unix"
+
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # A socket file left over by a previous, killed server is replaced.
+        try:
+            if stat.S_ISSOCK(os.lstat(self.server_address).st_mode):
+                os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+        super().server_bind()
+
+
+def make_server(queries, options):
+    """Bind the HTTP server for :class:`QueryServer` *queries* per *options*."""
+    try:
+        if options.socket:
+            server = _UnixServer(options.socket, _Handler)
+        else:
+            server = _TCPServer((options.host, options.port), _Handler)
+    except OSError as e:
+        where = options.socket or f"{options.host}:{options.port}"
+        raise DepvizError(f"cannot listen on {where}: {e.strerror or e}") from None
+    server.queries = queries
+    return server
+
+
+def serve(config):
+    """Load the configured repositories and answer queries until interrupted."""
+    queries = QueryServer(config)
+    server = make_server(queries, config.serve)
+    if config.serve.socket:
+        where = f"unix:{config.serve.socket}"
+    else:
+        host, port = server.server_address[:2]
+        where = f"http://{host}:{port}"
+    print(f"serving {queries.status()['packages']} packages on {where}", file=sys.stderr)
+    queries.start_refresh()
+    # Let a service manager's SIGTERM unwind through the cleanup below.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queries.stop()
+        server.server_close()
+        if config.serve.socket:
+            try:
+                os.unlink(config.serve.socket)
+            except OSError:
+                pass
+    return 0
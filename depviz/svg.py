@@ -0,0 +1,60 @@
+"""In-process SVG writer for dependency graphs (no Graphviz needed)."""
+
+from xml.sax.saxutils import escape
+
+from .errors import RenderError
+from .layout import NODE_HEIGHT, layered_layout
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="{w:.0f}" height="{h:.0f}" viewBox="0 0 {w:.0f} {h:.0f}">
+<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="8" markerHeight="8" orient="auto-start-reverse"><path d="M 0 0 L 10 5 L 0 10 z" fill="#555"/></marker></defs>
+<style>rect{{fill:#fff;stroke:#333}} rect.root{{stroke-width:2.5}} rect.missing{{stroke:#c00;stroke-dasharray:4 2}} text{{font:12px Helvetica,Arial,sans-serif;text-anchor:middle;dominant-baseline:central}} path{{fill:none;stroke:#555;marker-end:url(#arrow)}} path.back{{stroke:#c00;stroke-dasharray:5 3}}</style>
+"""
+
+
+def _edge_path(layout, u, v):
+    half = NODE_HEIGHT / 2
+    x1, x2 = layout.x[u], layout.x[v]
+    if layout.layer[v] > layout.layer[u]:
+        y1, y2 = layout.y[u] + half, layout.y[v] - half
+    else:
+        y1, y2 = layout.y[u] - half, layout.y[v] + half
+    if abs(layout.layer[v] - layout.layer[u]) <= 1:
+        return f"M {x1:.1f} {y1:.1f} L {x2:.1f} {y2:.1f}"
+    # Long edges are not routed through dummy nodes; a vertical-tangent
+    # cubic keeps them readable without extra layout work.
+    mid = (y1 + y2) / 2
+    return f"M {x1:.1f} {y1:.1f} C {x1:.1f} {mid:.1f} {x2:.1f} {mid:.1f} {x2:.1f} {y2:.1f}"
+
+
+def write_svg(graph, out):
+    """Lay out a :class:`~depviz.render.PackedGraph` and write SVG text to *out*."""
+    names = graph.names
+    edges = list(graph.iter_edge_ids())
+    root = names.index(graph.root)
+    layout = layered_layout(names, edges, root)
+    missing = graph.missing_names()
+
+    out.write(HEADER.format(w=layout.width, h=layout.height))
+    out.write("<g>\n")
+    for u, v in edges:
+        cls = ' class="back"' if (u, v) in layout.reversed_edges else ""
+        out.write(f'<path{cls} d="{_edge_path(layout, u, v)}"/>\n')
+    out.write("</g>\n<g>\n")
+    for node, name in enumerate(names):
+        x, y, w = layout.x[node], layout.y[node], layout.w[node]
+        cls = "root" if node == root else "missing" if name in missing else ""
+        cls_attr = f' class="{cls}"' if cls else ""
+        out.write(f'<rect{cls_attr} x="{x - w / 2:.1f}" y="{y - NODE_HEIGHT / 2:.1f}" '
+                  f'width="{w:.1f}" height="{NODE_HEIGHT:.0f}" rx="3"><title>{escape(name)}'
+                  f'</title></rect><text x="{x:.1f}" y="{y:.1f}">{escape(name)}</text>\n')
+    out.write("</g>\n</svg>\n")
+
+
+def render_svg(graph, path):
+    """Write the SVG image of *graph* to *path*."""
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            write_svg(graph, f)
+    except OSError as e:
+        raise RenderError(f"cannot write {path}: {e.strerror}") from None
@@ -0,0 +1,159 @@
+"""Test repositories: dependency graphs described in a text file.
+
+Each non-empty line has the form ``NAME: DEP DEP ...``; ``#`` starts a
+comment.  A package listed only as a dependency is treated as a leaf.
+
+The graph is stored CSR-style so synthetic repositories with millions of
+edges stay cheap: package names are interned to integer ids and each
+package's dependencies are a ``[start, end)`` slice of one ``targets``
+integer array.
+"""
+
+import itertools
+import mmap
+import os
+from array import array
+from collections import defaultdict
+
+from .apkindex import Package
+from .errors import IndexFormatError, RepositoryError
+from .names import NameTable
+
+
+class TestRepository:
+    """Compact adjacency-array graph.
+
+    It offers the lookup interface of :class:`~depviz.provides.ProvidesIndex`
+    (``names``, ``package``, ``resolve``, ``dependency_ids``, ``in``), so the
+    resolver and the renderers work on it unchanged.
+    """
+
+    def __init__(self):
+        self.names = NameTable()
+        self.starts = array("I")
+        self.ends = array("I")
+        self.targets = array("I")
+        self._defined = bytearray()
+
+    def intern(self, name):
+        """Return the id of *name*, allocating a leaf node on first sight."""
+        node = self.names.intern(name)
+        if node == len(self.starts):
+            self.starts.append(0)
+            self.ends.append(0)
+            self._defined.append(0)
+        return node
+
+    @classmethod
+    def from_csr(cls, names, nodes, bounds, targets):
+        """Build a repository from already interned arrays.
+
+        *names* are distinct and indexed by id; package ``nodes[i]`` depends
+        on ``targets[bounds[i]:bounds[i + 1]]``.
+        """
+        repo = cls()
+        repo.names = NameTable(names)
+        count = len(names)
+        starts = repo.starts = array("I", [0]) * count
+        ends = repo.ends = array("I", [0]) * count
+        defined = repo._defined = bytearray(count)
+        repo.targets = targets
+        for i, node in enumerate(nodes):
+            starts[node] = bounds[i]
+            ends[node] = bounds[i + 1]
+            defined[node] = 1
+        return repo
+
+    def add(self, name, depends):
+        node = self.intern(name)
+        if self._defined[node]:
+            raise ValueError(f"duplicate package {name}")
+        self._defined[node] = 1
+        start = len(self.targets)
+        self.targets.extend(self.intern(dep) for dep in depends)
+        self.starts[node] = start
+        self.ends[node] = len(self.targets)
+        return node
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __iter__(self):
+        return map(self.package, self.names)
+
+    def neighbors(self, node):
+        """Return the dependency ids of node id *node*."""
+        return self.targets[self.starts[node]:self.ends[node]]
+
+    def package(self, name):
+        node = self.names.lookup(name)
+        if node is None:
+            return None
+        return Package(name, depends=[self.names[dep] for dep in self.neighbors(node)])
+
+    get = package
+
+    def resolve(self, token):
+        return self.package(token)
+
+    def package_ids(self):
+        return range(len(self.starts))
+
+    def defines(self, node):
+        # Names seen only as dependencies are leaves, not missing packages.
+        return node < len(self.starts)
+
+    dependency_ids = neighbors
+
+
+def load_test_repository(path):
+    """Read the test repository file at *path* into a :class:`TestRepository`.
+
+    The file is memory-mapped and split by ``mmap.readline``.  Names stay
+    ``bytes`` while reading and get their ids from a ``defaultdict`` whose
+    factory is a C-level counter, so mapping a line's dependencies to ids
+    runs no Python code per name; each distinct name is decoded once at
+    the end.
+    """
+    try:
+        with open(path, "rb") as f:
+            empty = os.fstat(f.fileno()).st_size == 0
+            data = None if empty else mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except OSError as e:
+        raise RepositoryError(f"cannot read test repository {path}: {e.strerror}") from None
+    ids = defaultdict(itertools.count().__next__)
+    node_of = ids.__getitem__
+    defined = set()
+    nodes = array("I")
+    bounds = array("I", [0])
+    targets = array("I")
+    if data is not None:
+        with data:
+            for lineno, line in enumerate(iter(data.readline, b""), 1):
+                line = line.split(b"#", 1)[0].strip()
+                if not line:
+                    continue
+                name, sep, deps = line.partition(b":")
+                name = name.strip()
+                if not sep or not name or b" " in name:
+                    raise IndexFormatError(f"{path}:{lineno}: expected 'NAME: DEPS'")
+                node = node_of(name)
+                if node in defined:
+                    name = name.decode("utf-8", "replace")
+                    raise IndexFormatError(f"{path}:{lineno}: duplicate package {name}")
+                defined.add(node)
+                nodes.append(node)
+                targets.extend(map(node_of, deps.split()))
+                bounds.append(len(targets))
+    try:
+        names = list(map(bytes.decode, ids))
+    except UnicodeDecodeError as e:
+        raise IndexFormatError(f"{path}: package names must be UTF-8: {e}") from None
+    return TestRepository.from_csr(names, nodes, bounds, targets)
@@ -0,0 +1,80 @@
+"""apk version strings and dependency constraints.
+
+A version such as ``1.2.3a_rc1_p2-r3`` is tokenized once into a tuple that
+orders like apk does, so comparing two versions is a plain tuple
+comparison::
+
+    ((1, 2, 3), "a", ((-1, 1), (5, 2), (0, 0)), 3)
+      numbers   letter  suffixes (rank, number)  revision
+
+Pre-release suffixes rank below a bare release and post-release suffixes
+above it; the trailing ``(0, 0)`` stands for "no further suffix".
+"""
+
+import re
+from functools import lru_cache
+
+SUFFIX_RANKS = {
+    "alpha": -4, "beta": -3, "pre": -2, "rc": -1,
+    "cvs": 1, "svn": 2, "git": 3, "hg": 4, "p": 5,
+}
+NO_SUFFIX = (0, 0)
+
+VERSION_RE = re.compile(
+    r"^(?P<numbers>\d+(?:\.\d+)*)(?P<letter>[a-z]?)"
+    r"(?P<suffixes>(?:_[a-z]+\d*)*)(?:-r(?P<revision>\d+))?$"
+)
+SUFFIX_RE = re.compile(r"_([a-z]+)(\d*)")
+
+
+@lru_cache(maxsize=65536)
+def parse_version(text):
+    """Return the comparable key of version *text*.
+
+    Strings that are not valid apk versions sort before every valid one.
+    """
+    match = VERSION_RE.match(text)
+    if match is None:
+        return ((), "", (NO_SUFFIX,), -1)
+    numbers = tuple(int(part) for part in match["numbers"].split("."))
+    suffixes = []
+    for name, number in SUFFIX_RE.findall(match["suffixes"]):
+        suffixes.append((SUFFIX_RANKS.get(name, 0), int(number or 0)))
+    suffixes.append(NO_SUFFIX)
+    return numbers, match["letter"], tuple(suffixes), int(match["revision"] or 0)
+
+
+def _fuzzy(key, bound):
+    """``~`` matching: *key* starts with the components given in *bound*."""
+    numbers, letter, _, _ = bound
+    if key[0][:len(numbers)] != numbers:
+        return False
+    return not letter or key[1] == letter
+
+
+def satisfies(key, op, bound):
+    """Return whether version *key* meets the constraint ``op bound``.
+
+    Both sides are keys from :func:`parse_version`; an empty *op* accepts
+    any version.
+    """
+    if not op:
+        return True
+    if "~" in op:
+        if not _fuzzy(key, bound):
+            return False
+        op = op.replace("~", "").replace("=", "")
+        if not op:
+            return True
+    if op == "=":
+        return key == bound
+    if op == "<":
+        return key < bound
+    if op == ">":
+        return key > bound
+    if op == "<=":
+        return key <= bound
+    if op == ">=":
+        return key >= bound
+    # "><" pins a package checksum, which the index cannot verify here.
+    return op == "><"
@@ -0,0 +1 @@
+"""Regression tests; run with ``python -m unittest discover tests``."""
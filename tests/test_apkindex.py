@@ -0,0 +1,159 @@
+import gzip
+import io
+import os
+import random
+import tarfile
+import tempfile
+import unittest
+
+from depviz import apkindex
+from depviz.errors import IndexFormatError
+
+INDEX = b"".join(
+    b"C:Q1%040d=\nP:pkg%d\nV:1.%d-r0\nD:so:libc.musl-x86_64.so.1\n\n" % (i, i, i)
+    for i in range(40))
+# Longer than the 100 bytes of a plain tar name field: stored in the ustar
+# prefix field, a GNU long-name member or a pax header depending on the format.
+SIGNATURE = ".SIGN.RSA." + "builder" * 10 + "/" + "key" * 20 + ".rsa.pub"
+
+
+class SlowReader(io.BytesIO):
+    """Hands out at most a few bytes per read, like a trickling socket."""
+
+    def __init__(self, data, piece=7):
+        super().__init__(data)
+        self.piece = piece
+
+    def read(self, size=-1):
+        if size < 0 or size > self.piece:
+            size = self.piece
+        return super().read(size)
+
+
+def _tar(members, fmt, terminate):
+    out = bytearray()
+    for name, data in members:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        out += info.tobuf(fmt, "utf-8", "surrogateescape")
+        out += data + b"\0" * (-len(data) % tarfile.BLOCKSIZE)
+    if terminate:
+        out += b"\0" * (2 * tarfile.BLOCKSIZE)
+    return bytes(out)
+
+
+def _archive(fmt, members=None):
+    """Signature and index as two gzip members forming one tar stream."""
+    if members is None:
+        members = [("DESCRIPTION", b"test repository\n"), ("APKINDEX", INDEX)]
+    signature = gzip.compress(_tar([(SIGNATURE, b"signature")], fmt, False))
+    return signature + gzip.compress(_tar(members, fmt, True))
+
+
+class IterIndexChunksTest(unittest.TestCase):
+    FORMATS = {
+        "ustar": tarfile.USTAR_FORMAT,
+        "gnu": tarfile.GNU_FORMAT,
+        "pax": tarfile.PAX_FORMAT,
+    }
+
+    def test_formats_read_in_small_pieces(self):
+        for label, fmt in self.FORMATS.items():
+            archive = _archive(fmt)
+            for piece, chunk_size in ((1, 1), (7, 5), (512, 64), (len(archive), 1 << 16)):
+                with self.subTest(format=label, piece=piece, chunk_size=chunk_size):
+                    chunks = apkindex.iter_index_chunks(SlowReader(archive, piece), chunk_size)
+                    self.assertEqual(b"".join(chunks), INDEX)
+
+    def test_matches_tarfile(self):
+        for label, fmt in self.FORMATS.items():
+            with self.subTest(format=label):
+                archive = _archive(fmt)
+                with tarfile.open(fileobj=io.BytesIO(archive), mode="r:gz") as tar:
+                    names = tar.getnames()
+                    expected = tar.extractfile("APKINDEX").read()
+                self.assertEqual(names[0], SIGNATURE)
+                self.assertEqual(b"".join(apkindex.iter_index_chunks(io.BytesIO(archive))),
+                                 expected)
+
+    def test_stanzas_split_across_pieces(self):
+        chunks = apkindex.iter_index_chunks(SlowReader(_archive(tarfile.GNU_FORMAT), 3), 3)
+        names = [apkindex.parse_stanza(raw).name for raw in apkindex.iter_stanzas(chunks)]
+        self.assertEqual(names, [f"pkg{i}" for i in range(40)])
+
+    def test_missing_member(self):
+        archive = _archive(tarfile.PAX_FORMAT, [("DESCRIPTION", b"no index\n")])
+        with self.assertRaisesRegex(IndexFormatError, "no APKINDEX member"):
+            b"".join(apkindex.iter_index_chunks(SlowReader(archive)))
+
+    def test_truncated_archive(self):
+        archive = _archive(tarfile.USTAR_FORMAT)
+        with self.assertRaises(IndexFormatError):
+            b"".join(apkindex.iter_index_chunks(SlowReader(archive[:-40])))
+
+    def test_corrupt_header(self):
+        archive = gzip.compress(b"\x01" * tarfile.BLOCKSIZE)
+        with self.assertRaisesRegex(IndexFormatError, "invalid tar header"):
+            b"".join(apkindex.iter_index_chunks(io.BytesIO(archive)))
+
+
+class PoisonedReader(io.FileIO):
+    """Fails the test when anything at or past *limit* is read."""
+
+    def __init__(self, path, limit):
+        super().__init__(path)
+        self.limit = limit
+
+    def read(self, size=-1):
+        if size < 0 or self.tell() + size > self.limit:
+            raise AssertionError(f"read {size} bytes at {self.tell()}, limit {self.limit}")
+        return super().read(size)
+
+
+class FindPackageTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        stanzas = [b"C:Q1target=\nP:musl\nV:1.2.5-r0\nD:so:ld\n"]
+        # Near-incompressible filler, then a stanza a full parse rejects.
+        stanzas += [b"C:Q1%s=\nP:musl-%d\nV:1\n" % (rng.randbytes(600).hex().encode(), i)
+                    for i in range(1000)]
+        stanzas.append(b"V:1.0\n")
+        self.text = b"\n".join(stanzas)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def _write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_archive_reading_stops_at_the_match(self):
+        archive = _archive(tarfile.GNU_FORMAT, [("APKINDEX", self.text)])
+        limit = 2 * apkindex.CHUNK_SIZE
+        self.assertGreater(len(archive), 4 * limit)
+        with PoisonedReader(self._write("APKINDEX.tar.gz", archive), limit) as f:
+            pkg = apkindex.find_package(f, "musl")
+        self.assertEqual((pkg.name, pkg.version, pkg.depends), ("musl", "1.2.5-r0", ["so:ld"]))
+
+    def test_mapped_index_parses_only_the_match(self):
+        path = self._write("APKINDEX", self.text)
+        with open(path, "rb") as f, self.assertRaises(IndexFormatError):
+            list(apkindex.iter_packages(f))
+        # Only the two-byte format probe goes through read(); the rest is mapped.
+        with PoisonedReader(path, len(apkindex.GZIP_MAGIC)) as f:
+            pkg = apkindex.find_package(f, "musl")
+        self.assertEqual((pkg.name, pkg.checksum), ("musl", "Q1target="))
+        with PoisonedReader(path, len(apkindex.GZIP_MAGIC)) as f:
+            self.assertEqual(apkindex.find_package(f, "musl-999").version, "1")
+            self.assertIsNone(apkindex.find_package(f, "mus"))
+
+    def test_missing_package_reads_the_whole_archive(self):
+        archive = _archive(tarfile.GNU_FORMAT, [("APKINDEX", self.text)])
+        with open(self._write("APKINDEX.tar.gz", archive), "rb") as f:
+            self.assertIsNone(apkindex.find_package(f, "gcc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import io
+import unittest
+
+from depviz.ascii_tree import iter_tree_lines, write_tree
+
+
+def _diamonds(count):
+    """``n0 -> l0, r0 -> n1 -> ...``: the number of paths doubles per diamond."""
+    edges = {}
+    for i in range(count):
+        edges[f"n{i}"] = [f"l{i}", f"r{i}"]
+        edges[f"l{i}"] = [f"n{i + 1}"]
+        edges[f"r{i}"] = [f"n{i + 1}"]
+    edges[f"n{count}"] = []
+    return edges
+
+
+class TreeLinesTest(unittest.TestCase):
+    def test_collapse_keeps_output_linear_in_edges(self):
+        for count in (1, 4, 12):
+            with self.subTest(diamonds=count):
+                edges = _diamonds(count)
+                edge_count = sum(map(len, edges.values()))
+                collapsed = list(iter_tree_lines(edges, "n0", collapse=True))
+                expanded = sum(1 for _ in iter_tree_lines(edges, "n0", collapse=False))
+                self.assertEqual(len(collapsed), edge_count + 1)
+                self.assertEqual(sum(line.endswith("(see above)") for line in collapsed),
+                                 count - 1)
+                # Every path from the root is a line: diamond i adds 2^(i+1)
+                # copies of each of its sides and of the node below them.
+                self.assertEqual(expanded, 2 ** (count + 2) - 3)
+
+    def test_see_above(self):
+        edges = {"a": ["b", "c"], "b": ["d"], "c": ["d", "e"], "d": ["e"], "e": []}
+        self.assertEqual(list(iter_tree_lines(edges, "a")), [
+            "a",
+            "├── b",
+            "│   └── d",
+            "│       └── e",
+            "└── c",
+            "    ├── d (see above)",
+            "    └── e",
+        ])
+        self.assertEqual(list(iter_tree_lines(edges, "a", collapse=False))[5:], [
+            "    ├── d",
+            "    │   └── e",
+            "    └── e",
+        ])
+
+    def test_cycle_is_cut_in_both_modes(self):
+        edges = {"a": ["b"], "b": ["c", "a"], "c": ["b"]}
+        expected = [
+            "a",
+            "└── b",
+            "    ├── c",
+            "    │   └── b (cycle)",
+            "    └── a (cycle)",
+        ]
+        self.assertEqual(list(iter_tree_lines(edges, "a", collapse=True)), expected)
+        self.assertEqual(list(iter_tree_lines(edges, "a", collapse=False)), expected)
+
+    def test_self_loop_and_unknown_root(self):
+        self.assertEqual(list(iter_tree_lines({"a": ["a"]}, "a")), ["a", "└── a (cycle)"])
+        self.assertEqual(list(iter_tree_lines({}, "ghost")), ["ghost"])
+
+    def test_deep_chain_does_not_recurse(self):
+        edges = {i: [i + 1] for i in range(2000)}
+        lines = list(iter_tree_lines(edges, 0))
+        self.assertEqual(len(lines), 2001)
+        self.assertTrue(lines[-1].endswith("└── 2000"))
+
+    def test_write_tree_counts_lines(self):
+        out = io.StringIO()
+        self.assertEqual(write_tree(_diamonds(3), "n0", out), 13)
+        self.assertEqual(out.getvalue().count("\n"), 13)
+
+
+if __name__ == "__main__":
+    unittest.main()
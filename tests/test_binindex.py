@@ -0,0 +1,159 @@
+import gzip
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+
+from depviz import binindex, collector
+from depviz.apkindex import Package
+from depviz.config import parse_config
+from depviz.errors import IndexFormatError
+
+PACKAGES = [
+    Package("musl", "1.2.5-r0", [], ["so:libc.musl-x86_64.so.1=1"], "Q1musl="),
+    Package("busybox", "1.36.1-r29", ["so:libc.musl-x86_64.so.1"], ["cmd:sh"], "Q1busybox="),
+    Package("ünicode", "1.0", ["musl", "busybox>=1.36"], [], None),
+    # A later stanza of a name is shadowed by the first one.
+    Package("musl", "0.9", [], [], "Q1old="),
+]
+CHECKSUM = bytes(range(32))
+
+
+def _archive(packages):
+    stanzas = []
+    for pkg in packages:
+        lines = [f"C:{pkg.checksum}", f"P:{pkg.name}", f"V:{pkg.version}"]
+        if pkg.depends:
+            lines.append("D:" + " ".join(pkg.depends))
+        if pkg.provides:
+            lines.append("p:" + " ".join(pkg.provides))
+        stanzas.append("\n".join(lines) + "\n")
+    data = "\n".join(stanzas).encode()
+    info = tarfile.TarInfo("APKINDEX")
+    info.size = len(data)
+    tar = info.tobuf(tarfile.USTAR_FORMAT) + data + bytes(-len(data) % 512 + 1024)
+    return gzip.compress(tar)
+
+
+class BinaryIndexTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.path = os.path.join(self.dir, "index" + binindex.SUFFIX)
+
+    def _open(self, checksum=CHECKSUM):
+        index = binindex.BinaryIndex(self.path, checksum)
+        self.addCleanup(index.close)
+        return index
+
+    def test_round_trip(self):
+        binindex.write_index(self.path, CHECKSUM, PACKAGES)
+        index = self._open()
+        self.assertEqual(len(index), len(PACKAGES))
+        self.assertEqual(list(index), PACKAGES)
+        self.assertEqual([pkg.checksum for pkg in index], [pkg.checksum for pkg in PACKAGES])
+        self.assertEqual(index.get("ünicode"), PACKAGES[2])
+        self.assertIsNone(index.get("ünicode").checksum)
+        self.assertEqual(index.get("musl").version, "1.2.5-r0")
+        self.assertEqual(index.get("busybox").checksum, "Q1busybox=")
+
+    def test_missing_name(self):
+        binindex.write_index(self.path, CHECKSUM, PACKAGES)
+        index = self._open()
+        self.assertIsNone(index.get("gcc"))
+        self.assertIsNone(index.get(""))
+        # Probing a large table still ends at an empty slot.
+        binindex.write_index(self.path, CHECKSUM,
+                             [Package(f"pkg{i}", "1") for i in range(1000)])
+        index = self._open()
+        self.assertIsNone(index.get("pkg1000"))
+        self.assertEqual(index.get("pkg999").name, "pkg999")
+
+    def test_empty_package_list(self):
+        binindex.write_index(self.path, CHECKSUM, [])
+        index = self._open()
+        self.assertEqual(len(index), 0)
+        self.assertIsNone(index.get("musl"))
+
+    def test_different_archive_is_rejected(self):
+        binindex.write_index(self.path, CHECKSUM, PACKAGES)
+        with self.assertRaisesRegex(IndexFormatError, "different archive"):
+            binindex.BinaryIndex(self.path, bytes(32))
+        # Without a checksum the snapshot is taken as is.
+        self.assertEqual(len(self._open(None)), len(PACKAGES))
+
+    def test_truncated_and_empty_files(self):
+        binindex.write_index(self.path, CHECKSUM, PACKAGES)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        for size in (0, 10, binindex.HEADER.size, len(data) - 1):
+            with self.subTest(size=size):
+                with open(self.path, "wb") as f:
+                    f.write(data[:size])
+                with self.assertRaises(IndexFormatError):
+                    binindex.BinaryIndex(self.path, CHECKSUM)
+
+    def test_previous_format_is_rejected(self):
+        binindex.write_index(self.path, CHECKSUM, PACKAGES)
+        with open(self.path, "r+b") as f:
+            f.write(b"DVZIDX01")
+        with self.assertRaisesRegex(IndexFormatError, "not a binary index"):
+            binindex.BinaryIndex(self.path, CHECKSUM)
+
+    def test_archive_checksum_rewinds(self):
+        f = io.BytesIO(b"x" * 1000)
+        first = binindex.archive_checksum(f, chunk_size=7)
+        self.assertEqual(f.tell(), 0)
+        self.assertEqual(binindex.archive_checksum(f), first)
+
+    def test_index_path_is_per_source_path(self):
+        a = binindex.index_path(self.dir, "main/APKINDEX.tar.gz")
+        self.assertEqual(a, binindex.index_path(self.dir,
+                                                os.path.abspath("main/APKINDEX.tar.gz")))
+        self.assertNotEqual(a, binindex.index_path(self.dir, "community/APKINDEX.tar.gz"))
+        self.assertEqual(os.path.dirname(a), self.dir)
+        self.assertTrue(a.endswith(binindex.SUFFIX))
+
+
+class SnapshotCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive = os.path.join(tmp.name, "APKINDEX.tar.gz")
+        self.cache_dir = os.path.join(tmp.name, "cache")
+        os.mkdir(self.cache_dir)
+
+    def _load(self, packages):
+        with open(self.archive, "wb") as f:
+            f.write(_archive(packages))
+        config = parse_config({"package": "busybox", "repository": self.archive,
+                               "cache_dir": self.cache_dir})
+        return collector.load_index(config)
+
+    def _snapshots(self):
+        return [name for name in os.listdir(self.cache_dir) if name.endswith(binindex.SUFFIX)]
+
+    def test_new_archive_replaces_snapshot(self):
+        for version in ("1.0", "1.1", "1.2"):
+            packages = [Package("musl", version, [], [], f"Q1musl{version}="),
+                        Package("busybox", "1.36", ["musl"], [], "Q1busybox=")]
+            index = self._load(packages)
+            self.assertEqual(index.package("musl").version, version)
+            self.assertEqual(len(self._snapshots()), 1)
+        with open(self.archive, "rb") as f:
+            snapshot = collector._open_snapshot(f, self.cache_dir)
+        with snapshot:
+            self.assertEqual(snapshot.get("musl").checksum, "Q1musl1.2=")
+
+    def test_corrupt_snapshot_is_rebuilt(self):
+        self._load(PACKAGES[:2])
+        (name,) = self._snapshots()
+        with open(os.path.join(self.cache_dir, name), "wb") as f:
+            f.write(b"garbage")
+        self.assertEqual(list(self._load(PACKAGES[:2])), PACKAGES[:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
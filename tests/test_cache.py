@@ -0,0 +1,114 @@
+import http.server
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+from depviz import aiorepository, repository
+from depviz.cache import IndexCache
+
+ARCHIVE = b"\x1f\x8b not really an archive, the cache never looks inside"
+ETAG = '"v1"'
+LAST_MODIFIED = "Mon, 05 Oct 2026 10:00:00 GMT"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.get("If-None-Match"),
+                                self.headers.get("If-Modified-Since")))
+        if self.headers.get("If-None-Match") == server.etag:
+            self.send_response(304)
+            self.send_header("ETag", server.etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", server.etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        if server.chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(0, len(server.body), 5):
+                piece = server.body[i:i + 5]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(piece), piece))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        self.send_header("Content-Length", str(len(server.body)))
+        self.end_headers()
+        self.wfile.write(server.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CacheRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.requests = []
+        self.server.etag = ETAG
+        self.server.body = ARCHIVE
+        self.server.chunked = False
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = IndexCache(os.path.join(tmp.name, "cache"))
+        host, port = self.server.server_address
+        self.repo = f"http://{host}:{port}/alpine/main/x86_64"
+        self.url = repository.index_url(self.repo)
+
+    def _fetch(self):
+        with repository.open_index(self.repo, self.cache) as f:
+            return f.read()
+
+    def test_not_modified_is_served_from_cache(self):
+        self.assertEqual(self._fetch(), ARCHIVE)
+        self.assertEqual(self.server.requests,
+                         [("/alpine/main/x86_64/APKINDEX.tar.gz", None, None)])
+        with open(self.cache.archive_path(self.url), "rb") as f:
+            self.assertEqual(f.read(), ARCHIVE)
+
+        self.assertEqual(self._fetch(), ARCHIVE)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.requests[1][1:], (ETAG, LAST_MODIFIED))
+
+    def test_changed_archive_replaces_cache_entry(self):
+        self._fetch()
+        self.server.etag = '"v2"'
+        self.server.body = ARCHIVE + b" v2"
+        self.assertEqual(self._fetch(), ARCHIVE + b" v2")
+        self.assertEqual(self.cache.validators(self.url)["If-None-Match"], '"v2"')
+        self.assertEqual(self._fetch(), ARCHIVE + b" v2")
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_async_client_shares_the_cache(self):
+        self._fetch()
+        files = aiorepository.open_indexes([self.repo, self.repo], self.cache)
+        try:
+            self.assertEqual([f.read() for f in files], [ARCHIVE, ARCHIVE])
+        finally:
+            for f in files:
+                f.close()
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertTrue(all(etag == ETAG for _, etag, _ in self.server.requests[1:]))
+
+    def test_async_client_without_cache_spools_the_body(self):
+        for chunked in (False, True):
+            with self.subTest(chunked=chunked):
+                self.server.chunked = chunked
+                (f,) = aiorepository.open_indexes([self.repo])
+                with f:
+                    self.assertNotIsInstance(f, io.BytesIO)
+                    self.assertEqual(f.read(), ARCHIVE)
+        self.assertEqual([etag for _, etag, _ in self.server.requests], [None, None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import http.server
+import io
+import tarfile
+import threading
+import time
+import unittest
+
+from depviz import collector
+from depviz.config import parse_config
+
+DELAY = 0.4
+
+
+def _archive(stanzas):
+    data = "\n".join(stanzas).encode()
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w:gz", format=tarfile.USTAR_FORMAT) as tar:
+        info = tarfile.TarInfo("APKINDEX")
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+
+def _stanza(name, version, depends=()):
+    lines = [f"C:Q1{name}{version}=", f"P:{name}", f"V:{version}"]
+    if depends:
+        lines.append("D:" + " ".join(depends))
+    return "\n".join(lines) + "\n"
+
+
+class _SlowHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        # Stands in for a distant mirror: every answer takes DELAY seconds.
+        time.sleep(DELAY)
+        body = self.server.body
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ConcurrentFetchTest(unittest.TestCase):
+    REPOSITORIES = [
+        [_stanza("app", "1.0", ["shared", "lib-main"]), _stanza("shared", "1.0"),
+         _stanza("lib-main", "1.0")],
+        [_stanza("shared", "2.0", ["lib-community"]), _stanza("lib-community", "1.0")],
+        [_stanza("tool", "3.0", ["shared"])],
+    ]
+
+    def setUp(self):
+        self.urls = []
+        for stanzas in self.REPOSITORIES:
+            server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+            server.body = _archive(stanzas)
+            thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+            thread.start()
+            self.addCleanup(thread.join)
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+            host, port = server.server_address
+            self.urls.append(f"http://{host}:{port}/alpine/v3.20/repo{len(self.urls)}")
+
+    def _config(self, **options):
+        return parse_config({"package": "app", "repository": self.urls, **options})
+
+    def assertConcurrent(self, started):
+        elapsed = time.perf_counter() - started
+        # Sequential fetches would take len(urls) * DELAY.
+        self.assertLess(elapsed, DELAY * (len(self.urls) + 1) / 2)
+
+    def test_total_time_approaches_slowest_fetch(self):
+        for options in ({}, {"async_fetch": True}):
+            with self.subTest(**options):
+                config = self._config(**options)
+                started = time.perf_counter()
+                index = collector.load_index(config)
+                self.assertConcurrent(started)
+                self.assertEqual(len(index), 5)
+
+    def test_first_listed_repository_wins(self):
+        for options in ({}, {"async_fetch": True}):
+            with self.subTest(**options):
+                config = self._config(**options)
+                graph = collector.Collector(config).graph("tool")
+                self.assertEqual(graph.edges, {"tool": ["shared"], "shared": []})
+                self.assertEqual(collector.find_package(config, "shared").version, "1.0")
+                self.assertEqual(collector.direct_dependencies(config, "shared"), [])
+
+    def test_single_package_lookup_is_concurrent(self):
+        started = time.perf_counter()
+        self.assertEqual(collector.direct_dependencies(self._config(), "tool"), ["shared"])
+        self.assertConcurrent(started)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from depviz import testrepo
+from depviz.graph import Resolver
+
+
+def _repository():
+    repo = testrepo.TestRepository()
+    repo.add("app", ["lib", "tool"])
+    repo.add("lib", ["base"])
+    # tool and util need each other.
+    repo.add("tool", ["base", "util"])
+    repo.add("util", ["tool"])
+    repo.add("base", [])
+    repo.add("other", ["util"])
+    return repo
+
+
+class ReverseClosureTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = _repository()
+        self.resolver = Resolver(self.repo)
+
+    def dependents(self, name):
+        names = self.repo.names
+        return [names.strings[node] for node in self.resolver.dependent_ids(names.lookup(name))]
+
+    def test_dependent_ids(self):
+        self.assertEqual(self.dependents("base"), ["lib", "tool"])
+        self.assertEqual(self.dependents("tool"), ["app", "util"])
+        self.assertEqual(self.dependents("util"), ["tool", "other"])
+        self.assertEqual(self.dependents("app"), [])
+
+    def test_reverse_closure_with_cycle(self):
+        graph = self.resolver.reverse_closure("base")
+        self.assertTrue(graph.reverse)
+        self.assertEqual(graph.edges, {
+            "base": ["lib", "tool"],
+            "lib": ["app"],
+            "app": [],
+            "tool": ["app", "util"],
+            "util": ["tool", "other"],
+            "other": [],
+        })
+        self.assertEqual(graph.cycles, [("util", "tool")])
+        self.assertEqual(graph.missing, set())
+        self.assertRegex(graph.summary(),
+                         r"^base: needed by 5 packages, 7 edges, 1 cycles, resolved in ")
+        self.assertIs(self.resolver.reverse_closure("base"), graph)
+
+    def test_reverse_of_forward_closure(self):
+        # Everything in base's reverse closure has base in its forward closure.
+        for name in self.resolver.reverse_closure("base").edges:
+            self.assertIn("base", self.resolver.closure(name).edges)
+
+    def test_nothing_depends_on_root(self):
+        graph = self.resolver.reverse_closure("app")
+        self.assertEqual(graph.edges, {"app": []})
+        self.assertRegex(graph.summary(), r"^app: needed by 0 packages, 0 edges, 0 cycles")
+
+
+if __name__ == "__main__":
+    unittest.main()
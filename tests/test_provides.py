@@ -0,0 +1,146 @@
+import random
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from depviz.apkindex import Package, iter_mapped_spans, parse_stanza
+from depviz.graph import Resolver
+from depviz.provides import ProvidesIndex, index_parallel
+
+
+def _packages(rng, count, prefix="p"):
+    packages = []
+    for i in range(count):
+        depends = [rng.choice([
+            f"so:lib{rng.randrange(8)}",
+            f"{prefix}{rng.randrange(count)}",
+            "cmd:x",
+            f"!{prefix}{rng.randrange(count)}",
+            f"so:lib{rng.randrange(8)}>=1.{rng.randrange(3)}",
+        ]) for _ in range(rng.randrange(4))]
+        provides = [f"so:lib{rng.randrange(8)}=1.{rng.randrange(3)}"
+                    for _ in range(rng.randrange(3))]
+        if rng.random() < 0.2:
+            provides.append("cmd:x")
+        packages.append(Package(f"{prefix}{i}", f"1.{rng.randrange(3)}", depends, provides,
+                                f"Q1{rng.getrandbits(64):x}="))
+    return packages
+
+
+def _stanza(pkg):
+    lines = [f"C:{pkg.checksum}", f"P:{pkg.name}", f"V:{pkg.version}"]
+    if pkg.depends:
+        lines.append("D:" + " ".join(pkg.depends))
+    if pkg.provides:
+        lines.append("p:" + " ".join(pkg.provides))
+    return "\n".join(lines) + "\n"
+
+
+def _update(index, resolver, packages):
+    changes = index.diff(packages)
+    index.apply(changes)
+    changes.dropped = resolver.invalidate(changes.affected)
+    return changes
+
+
+class IncrementalApplyTest(unittest.TestCase):
+    def assertSameIndex(self, index, resolver, packages, roots):
+        fresh = ProvidesIndex(packages)
+        fresh_resolver = Resolver(fresh)
+        self.assertEqual(list(index), list(fresh))
+        self.assertEqual([index.names.strings[node] for node in index.package_ids()],
+                         [fresh.names.strings[node] for node in fresh.package_ids()])
+        for name in sorted(set(index.names.strings) | set(fresh.names.strings)):
+            self.assertEqual(index.providers(name), fresh.providers(name), name)
+        for root in roots:
+            got, want = resolver.closure(root), fresh_resolver.closure(root)
+            self.assertEqual((got.edges, got.missing, got.cycles),
+                             (want.edges, want.missing, want.cycles), root)
+            got, want = resolver.reverse_closure(root), fresh_resolver.reverse_closure(root)
+            self.assertEqual(got.edges, want.edges, root)
+
+    def test_matches_fresh_index(self):
+        for seed in range(100):
+            with self.subTest(seed=seed):
+                rng = random.Random(seed)
+                old = _packages(rng, 30)
+                new = [pkg for pkg in old if rng.random() > 0.1]
+                new = [Package(pkg.name, pkg.version, pkg.depends, pkg.provides, "Q1changed=")
+                       if rng.random() < 0.1 else pkg for pkg in new]
+                for pkg in _packages(rng, 40)[30:]:
+                    new.insert(rng.randrange(len(new) + 1), pkg)
+                if seed % 3 == 0:
+                    i, j = rng.randrange(len(new)), rng.randrange(len(new))
+                    new[i], new[j] = new[j], new[i]
+
+                index = ProvidesIndex(old)
+                resolver = Resolver(index)
+                for pkg in old:
+                    resolver.closure(pkg.name)
+                    resolver.reverse_closure(pkg.name)
+                _update(index, resolver, new)
+                self.assertSameIndex(index, resolver, new, [pkg.name for pkg in old + new])
+
+    def test_added_repository_takes_priority(self):
+        app = Package("app", "1.0", ["foo"], [], "Q1app=")
+        community = Package("foo-community", "1.0", [], ["foo"], "Q1community=")
+        main = Package("foo-main", "1.0", [], ["foo"], "Q1main=")
+        index = ProvidesIndex([app, community])
+        resolver = Resolver(index)
+        self.assertEqual(resolver.closure("app").edges["app"], ["foo-community"])
+
+        # A repository listed before the existing one is added to the config.
+        changes = _update(index, resolver, [main, app, community])
+        self.assertEqual([pkg.name for pkg in changes.added], ["foo-main"])
+        self.assertIn("app", changes.dropped)
+        self.assertEqual(resolver.closure("app").edges["app"], ["foo-main"])
+        self.assertSameIndex(index, resolver, [main, app, community], ["app"])
+
+    def test_unchanged_stream_is_a_no_op(self):
+        packages = _packages(random.Random(1), 20)
+        index = ProvidesIndex(packages)
+        changes = index.diff(packages)
+        self.assertFalse(changes)
+        index.apply(changes)
+        self.assertEqual(changes.affected, set())
+
+
+
+class MergeTest(unittest.TestCase):
+    def assertSameProviders(self, merged, sequential):
+        self.assertEqual(list(merged), list(sequential))
+        for name in sequential.names.strings:
+            self.assertEqual(merged.providers(name), sequential.providers(name), name)
+
+    def test_merge_matches_sequential_add(self):
+        rng = random.Random(7)
+        first, second = _packages(rng, 25), _packages(rng, 25, prefix="q")
+        merged = ProvidesIndex(first)
+        merged.merge(ProvidesIndex(second).chunk())
+        self.assertSameProviders(merged, ProvidesIndex(first + second))
+
+    def test_merge_keeps_existing_records(self):
+        # Both halves define p0..p24: the first definition of a name wins.
+        rng = random.Random(8)
+        first, second = _packages(rng, 25), _packages(rng, 30)
+        merged = ProvidesIndex(first)
+        merged.merge(ProvidesIndex(second).chunk())
+        self.assertSameProviders(merged, ProvidesIndex(first + second))
+        pkg = merged.package("p3")
+        self.assertEqual((pkg.version, pkg.depends, pkg.provides),
+                         (first[3].version, first[3].depends, first[3].provides))
+
+    def test_index_parallel_matches_sequential_parse(self):
+        packages = _packages(random.Random(9), 200)
+        data = "\n".join(map(_stanza, packages)).encode()
+        sequential = ProvidesIndex(parse_stanza(data, start, end)
+                                   for start, end in iter_mapped_spans(data))
+        for parts in (1, 3, 7):
+            with self.subTest(parts=parts), ThreadPoolExecutor(2) as pool:
+                merged = ProvidesIndex()
+                for chunk in index_parallel(data, pool, parts):
+                    merged.merge(chunk)
+                self.assertSameProviders(merged, sequential)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import random
+import unittest
+
+from depviz.graph import DependencyGraph
+from depviz.prune import (COMMON_BASE, collapse_common, limit_depth, simplify,
+                          transitive_reduction)
+
+
+def _reachable(edges, start, skip):
+    """Nodes reachable from *start* without using edge *skip*."""
+    seen = set()
+    stack = [dep for dep in edges[start] if (start, dep) != skip]
+    while stack:
+        node = stack.pop()
+        if node not in seen:
+            seen.add(node)
+            stack.extend(edges[node])
+    return seen
+
+
+class TransitiveReductionTest(unittest.TestCase):
+    def test_diamond_loses_shortcut(self):
+        graph = DependencyGraph("a", {"a": ["b", "c"], "b": ["c"], "c": []})
+        reduced = transitive_reduction(graph)
+        self.assertEqual(reduced.edges, {"a": ["b"], "b": ["c"], "c": []})
+        # The input graph is left alone.
+        self.assertEqual(graph.edges["a"], ["b", "c"])
+
+    def test_cycle_back_edge_is_kept(self):
+        graph = DependencyGraph("a", {"a": ["b", "c"], "b": ["c"], "c": ["a"]},
+                                cycles=[("c", "a")])
+        reduced = transitive_reduction(graph)
+        self.assertEqual(reduced.edges, {"a": ["b"], "b": ["c"], "c": ["a"]})
+        self.assertEqual(reduced.cycles, [("c", "a")])
+
+    def test_duplicate_edges(self):
+        graph = DependencyGraph("a", {"a": ["b", "b", "c", "c"], "b": ["d", "d"],
+                                      "c": [], "d": []})
+        reduced = transitive_reduction(graph)
+        self.assertEqual(reduced.edges, {"a": ["b", "c"], "b": ["d"], "c": [], "d": []})
+
+    def test_long_chain_keeps_only_direct_steps(self):
+        names = [f"n{i}" for i in range(50)]
+        edges = {name: names[i + 1:] for i, name in enumerate(names)}
+        reduced = transitive_reduction(DependencyGraph("n0", edges))
+        self.assertEqual(reduced.edges, {name: names[i + 1:i + 2]
+                                         for i, name in enumerate(names)})
+
+    def test_random_dags_match_brute_force(self):
+        for seed in range(200):
+            with self.subTest(seed=seed):
+                rng = random.Random(seed)
+                names = [f"n{i}" for i in range(rng.randrange(2, 15))]
+                edges = {name: [names[j] for j in range(i + 1, len(names))
+                                if rng.random() < 0.3]
+                         for i, name in enumerate(names)}
+                reduced = transitive_reduction(DependencyGraph("n0", edges))
+                # An edge u -> v is redundant iff v stays reachable without it.
+                expected = {u: [v for v in deps if v not in _reachable(edges, u, (u, v))]
+                            for u, deps in edges.items()}
+                self.assertEqual(reduced.edges, expected)
+
+
+# app needs ui and net; everything ends in libc and both libraries share zlib.
+EDGES = {
+    "app": ["ui", "net", "libc"],
+    "ui": ["libc", "zlib"],
+    "net": ["libc", "zlib", "ssl"],
+    "ssl": ["libc"],
+    "zlib": ["libc", "crc"],
+    "libc": [],
+    "crc": [],
+}
+
+
+class LimitDepthTest(unittest.TestCase):
+    def test_zero_keeps_only_the_root(self):
+        graph = DependencyGraph("app", EDGES, missing={"ssl"})
+        limited = limit_depth(graph, 0)
+        self.assertEqual(limited.edges, {"app": []})
+        self.assertEqual(limited.missing, set())
+
+    def test_cuts_edges_below_the_limit(self):
+        graph = DependencyGraph("app", EDGES, missing={"crc"},
+                                cycles=[("zlib", "crc")])
+        limited = limit_depth(graph, 1)
+        self.assertEqual(limited.edges, {"app": ["ui", "net", "libc"],
+                                         "ui": [], "net": [], "libc": []})
+        limited = limit_depth(graph, 2)
+        self.assertEqual(set(limited.edges), {"app", "ui", "net", "libc", "zlib", "ssl"})
+        self.assertEqual(limited.edges["zlib"], [])
+        self.assertEqual((limited.missing, limited.cycles), (set(), []))
+
+    def test_depth_beyond_the_graph_is_a_copy(self):
+        limited = limit_depth(DependencyGraph("app", EDGES), 10)
+        self.assertEqual(limited.edges, EDGES)
+
+
+class CollapseCommonTest(unittest.TestCase):
+    def test_fewer_than_two_common_nodes_is_unchanged(self):
+        graph = DependencyGraph("app", EDGES)
+        # Only libc has 5 dependents.
+        self.assertIs(collapse_common(graph, 5), graph)
+        self.assertIs(collapse_common(graph, 50), graph)
+
+    def test_cluster_keeps_outgoing_edges_of_members(self):
+        graph = DependencyGraph("app", EDGES)
+        # libc (5 dependents) and zlib (2) are merged; zlib's edge to crc stays.
+        collapsed = collapse_common(graph, 2)
+        cluster = COMMON_BASE.format(2)
+        self.assertEqual(collapsed.edges, {
+            "app": ["ui", "net", cluster],
+            "ui": [cluster],
+            "net": [cluster, "ssl"],
+            "ssl": [cluster],
+            "crc": [],
+            cluster: ["crc"],
+        })
+
+    def test_root_is_never_collapsed(self):
+        edges = {"a": ["b", "c"], "b": ["a", "c"], "c": ["a"]}
+        collapsed = collapse_common(DependencyGraph("a", edges), 2)
+        self.assertEqual(collapsed.edges, {"a": ["b", "c"], "b": ["a", "c"], "c": ["a"]})
+
+
+class SimplifyTest(unittest.TestCase):
+    def test_defaults_leave_the_graph_alone(self):
+        graph = DependencyGraph("app", EDGES)
+        self.assertIs(simplify(graph), graph)
+
+    def test_all_steps(self):
+        graph = DependencyGraph("app", EDGES)
+        simplified = simplify(graph, max_depth=2, collapse_in_degree=2, reduce=True)
+        # Depth 2 drops crc and the edges of zlib and ssl, so the reduction
+        # only removes app -> libc; libc and zlib are left with two
+        # dependents each and collapse.
+        cluster = COMMON_BASE.format(2)
+        self.assertEqual(simplified.edges, {
+            "app": ["ui", "net"],
+            "ui": [cluster],
+            "net": [cluster, "ssl"],
+            "ssl": [],
+            cluster: [],
+        })
+        self.assertEqual(graph.edges, EDGES)
+
+
+if __name__ == "__main__":
+    unittest.main()
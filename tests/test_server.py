@@ -0,0 +1,140 @@
+import contextlib
+import gzip
+import io
+import json
+import os
+import tarfile
+import tempfile
+import threading
+import unittest
+from http import HTTPStatus
+from unittest import mock
+
+from depviz.config import parse_config
+from depviz.errors import RenderError
+from depviz.server import TEXT, QueryServer
+
+STANZAS = {
+    "app": ("1.0", ["lib", "tool", "!legacy"]),
+    "lib": ("1.0", ["base"]),
+    "tool": ("2.0", ["base"]),
+    "base": ("1.0", []),
+}
+
+
+def _write_archive(path, stanzas):
+    text = "\n".join(
+        f"C:Q1{name}{version}=\nP:{name}\nV:{version}\n"
+        + (f"D:{' '.join(depends)}\n" if depends else "")
+        for name, (version, depends) in stanzas.items()).encode()
+    info = tarfile.TarInfo("APKINDEX")
+    info.size = len(text)
+    tar = info.tobuf(tarfile.USTAR_FORMAT) + text + bytes(-len(text) % 512 + 1024)
+    with open(path, "wb") as f:
+        f.write(gzip.compress(tar))
+
+
+class QueryServerTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive = os.path.join(tmp.name, "APKINDEX.tar.gz")
+        _write_archive(self.archive, STANZAS)
+        self.queries = QueryServer(parse_config({"package": "app", "repository": self.archive}))
+
+    def get(self, target, status=HTTPStatus.OK):
+        code, content_type, body = self.queries.handle(target)
+        self.assertEqual(code, status, body)
+        return content_type, body
+
+    def text(self, target, status=HTTPStatus.OK):
+        content_type, body = self.get(target, status)
+        self.assertEqual(content_type, TEXT)
+        return body.decode()
+
+    def test_status(self):
+        content_type, body = self.get("/status")
+        self.assertEqual(content_type, "application/json")
+        status = json.loads(body)
+        self.assertEqual(status["packages"], 4)
+        self.assertEqual(status["repositories"], [self.archive])
+        self.assertIsNone(status["last_refresh"])
+
+    def test_text_endpoints(self):
+        self.assertEqual(self.text("/deps/app"), "lib\ntool\n")
+        self.assertEqual(self.text("/edges/app"),
+                         "app: lib tool\nlib: base\nbase: \ntool: base\n")
+        self.assertEqual(self.text("/tree/app"),
+                         "app\n├── lib\n│   └── base\n└── tool\n    └── base\n")
+        self.assertEqual(self.text("/tree/base?reverse=1"),
+                         "base\n├── lib\n│   └── app\n└── tool\n    └── app\n")
+        self.assertEqual(self.text("/edges/base?reverse=0"), "base: \n")
+
+    def test_image(self):
+        content_type, body = self.get("/image/app.svg")
+        self.assertEqual(content_type, "image/svg+xml")
+        self.assertIn(b"<svg", body)
+        self.assertIs(self.get("/image/app.svg")[1], body)
+
+    def test_errors(self):
+        self.assertIn("image name must end with", self.text("/image/app.txt",
+                                                             HTTPStatus.BAD_REQUEST))
+        self.assertIn("'nope' not found", self.text("/deps/nope", HTTPStatus.NOT_FOUND))
+        self.assertIn("'nope' not found", self.text("/tree/nope", HTTPStatus.NOT_FOUND))
+        self.assertEqual(self.text("/deps", HTTPStatus.NOT_FOUND), "unknown endpoint\n")
+        self.assertEqual(self.text("/what/app", HTTPStatus.NOT_FOUND), "unknown endpoint\n")
+        with mock.patch("depviz.server.render_image", side_effect=RenderError("dot crashed")):
+            self.assertEqual(self.text("/image/app.png", HTTPStatus.INTERNAL_SERVER_ERROR),
+                             "dot crashed\n")
+        # A failed render is not cached.
+        self.assertNotIn(("image", "app", False, "png"), self.queries._state.rendered)
+
+    def test_refresh(self):
+        tree = self.text("/tree/app")
+        self.text("/tree/base")
+        changed = dict(STANZAS, lib=("1.1", ["base", "extra"]), extra=("1.0", []))
+        _write_archive(self.archive, changed)
+        with contextlib.redirect_stderr(io.StringIO()) as log:
+            self.queries.refresh()
+        self.assertIn("1 changed, 1 added, 0 removed", log.getvalue())
+
+        refresh = json.loads(self.get("/status")[1])["last_refresh"]
+        self.assertEqual((refresh["changed"], refresh["added"], refresh["removed"]), (1, 1, 0))
+        self.assertEqual(self.text("/deps/lib"), "base\nextra\n")
+        self.assertNotEqual(self.text("/tree/app"), tree)
+        self.assertIn("extra", self.text("/tree/app"))
+        # base's closure does not reach lib, so its cached answer survives.
+        self.assertIn(("tree", "base", False), self.queries._state.rendered)
+
+    def test_queries_are_answered_while_an_image_renders(self):
+        rendering, release = threading.Event(), threading.Event()
+
+        def slow_render(graph, path, engine):
+            rendering.set()
+            release.wait(10)
+            with open(path, "wb") as f:
+                f.write(b"<svg/>")
+
+        with mock.patch("depviz.server.render_image", slow_render):
+            image = threading.Thread(target=self.queries.handle, args=("/image/app.svg",))
+            image.start()
+            self.addCleanup(image.join)
+            self.addCleanup(release.set)
+            self.assertTrue(rendering.wait(10))
+
+            answers = []
+            query = threading.Thread(target=lambda: answers.extend(
+                self.queries.handle(target)[0] for target in
+                ("/deps/app", "/tree/app", "/edges/tool", "/tree/base?reverse=1", "/status")))
+            query.start()
+            query.join(5)
+            self.assertFalse(query.is_alive(), "text queries waited for the render")
+            self.assertEqual(answers, [HTTPStatus.OK] * 5)
+            self.assertTrue(image.is_alive())
+            release.set()
+            image.join(10)
+        self.assertEqual(self.get("/image/app.svg")[1], b"<svg/>")
+
+
+if __name__ == "__main__":
+    unittest.main()
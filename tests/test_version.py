@@ -0,0 +1,49 @@
+import unittest
+
+from depviz.version import parse_version, satisfies
+
+
+class ParseVersionTest(unittest.TestCase):
+    def test_ordering(self):
+        ordered = [
+            "not-a-version",
+            "1.0_alpha",
+            "1.0_alpha2",
+            "1.0_beta",
+            "1.0_pre1",
+            "1.0_rc1",
+            "1.0",
+            "1.0-r1",
+            "1.0-r10",
+            "1.0_p1",
+            "1.0a",
+            "1.0.1",
+            "1.2",
+            "1.10",
+            "2",
+        ]
+        keys = [parse_version(text) for text in ordered]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+
+    def test_post_release_suffixes(self):
+        self.assertLess(parse_version("1.0_cvs"), parse_version("1.0_git"))
+        self.assertLess(parse_version("1.0_git"), parse_version("1.0_p"))
+        self.assertLess(parse_version("1.0"), parse_version("1.0_cvs"))
+
+    def test_numeric_components_compare_as_numbers(self):
+        self.assertLess(parse_version("1.9"), parse_version("1.10"))
+        self.assertEqual(parse_version("1.01"), parse_version("1.1"))
+
+    def test_satisfies(self):
+        key = parse_version("1.2.3-r1")
+        self.assertTrue(satisfies(key, ">=", parse_version("1.2")))
+        self.assertTrue(satisfies(key, "<", parse_version("1.3")))
+        self.assertFalse(satisfies(key, "=", parse_version("1.2.3")))
+        self.assertTrue(satisfies(key, "~", parse_version("1.2")))
+        self.assertFalse(satisfies(key, "~", parse_version("1.3")))
+        self.assertTrue(satisfies(key, "", parse_version("9")))
+
+
+if __name__ == "__main__":
+    unittest.main()